@@ -1,11 +1,52 @@
+import argparse
 import csv
-import re
-from SPARQLWrapper import SPARQLWrapper, JSON
+import email.utils
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+from identifiers import expand
+from profiling import profiler
 
 
 # Script qui permet de récupérer les informations des imprimeurs ayant un identifiant (isni ou viaf)
 # avec une requête SPARQL sur IdRef
 
+# adresse de l'endpoint SPARQL d'IdRef
+endpoint = "https://data.idref.fr/sparql"
+
+# TSV écrit par la récolte
+tsv_path = "base_imprimeurs_sparql.tsv"
+
+# codes HTTP des erreurs passagères, pour lesquelles la requête est relancée (les autres erreurs, par exemple une
+# erreur 400 due à un identifiant mal formé, ne disparaîtraient pas en réessayant)
+transient_statuses = {429, 500, 502, 503, 504}
+
+# séparateur des valeurs regroupées par GROUP_CONCAT dans la requête SPARQL, et variables concernées
+separator = "\t"
+grouped = {"ident", "autreNom", "infos", "infos2"}
+
+# colonnes du TSV : (nom de la colonne, variable SPARQL, True si toutes les valeurs sont gardées sous forme de liste)
+columns = [
+    ("Nom", "nom", False),
+    ("Lien_IdRef", "person", False),
+    ("Identifiants", "ident", True),
+    ("Identifiant_BnF", "bnf", False),
+    ("Autres_formes_du_Nom", "autreNom", True),
+    ("Naissance", "naissance", False),
+    ("Mort", "mort", False),
+    ("Genre", "genre", False),
+    ("Informations", "infos", True),
+    ("Autres_Informations", "infos2", True),
+]
+
 
 def get_data():
     """ 
@@ -21,777 +62,499 @@ def get_data():
         tsvreader = csv.reader(tsvfile, delimiter="\t")
         next(tsvreader, None)  # cette ligne sert à ne pas lire les headers du fichier
         for row in tsvreader:
-            ident = row[2]
             # on enlève les espaces vides dans les identifiants et on les complète avec les adresses pour pouvoir les
             # utiliser dans le SPARQL
-            ident = re.sub(" ", "", ident)
-            ident = re.sub("^(isni:)", "http://isni.org/isni/", ident)
-            ident = re.sub("^(viaf:)", "http://viaf.org/viaf/", ident)
+            ident = expand(row[2])
             if ident:
                 data.append(ident)
         return data
 
 
-def get_sparql(item):
+def open_session(pool_size=1):
     """
-    Avec cette fonction, pour chacun des identifiants récupérés dans la liste des imprimeurs, on effectue une requête 
-    SPARQL sur IdRef pour récupérer les informations qui lui sont liées
+    Crée une session HTTP dont les connexions (keep-alive) sont réutilisées d'une requête à l'autre, avec un pool
+    de pool_size connexions par hôte (une par thread de la récolte). Les réponses sont demandées compressées (gzip).
+    Retourne la session.
+    """
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept": "application/sparql-results+json", "Accept-Encoding": "gzip, deflate"})
+    return session
+
+
+# session HTTP du module, utilisée par les requêtes faites sans session (get_sparql) ; créée au premier appel
+module_session = None
+module_session_lock = threading.Lock()
+
+
+def shared_session():
+    """
+    Retourne la session HTTP du module (open_session), créée au premier appel puis réutilisée, pour que les requêtes
+    isolées (get_sparql) gardent la même connexion au lieu d'en ouvrir une nouvelle à chaque appel.
     """
-    identifier = item
 
-    sparql = SPARQLWrapper("https://data.idref.fr/sparql")
-    sparql.setQuery("""
+    global module_session
+    with module_session_lock:
+        if module_session is None:
+            module_session = open_session()
+        return module_session
+
+
+def sparql_query(items):
+    """
+    Construit la requête SPARQL sur IdRef pour plusieurs identifiants : les identifiants sont passés dans un bloc
+    VALUES, et la variable ?id de chaque résultat permet de retrouver l'identifiant auquel il correspond.
+    Chaque propriété est cherchée dans une branche UNION distincte, puis les valeurs sont regroupées par personne
+    (GROUP_CONCAT, séparées par une tabulation) : on obtient une seule ligne par imprimeur au lieu du produit
+    cartésien de toutes ses propriétés.
+    Retourne le texte de la requête.
+    """
+
+    return """
         PREFIX foaf: <http://xmlns.com/foaf/0.1/> 
         PREFIX bio: <http://purl.org/vocab/bio/0.1/>
         PREFIX rdau: <http://rdaregistry.info/Elements/u/>
         PREFIX owl: <http://www.w3.org/2002/07/owl#>
         PREFIX bnf-onto: <http://data.bnf.fr/ontology/bnf-onto/>
         PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-        SELECT DISTINCT ?person ?ident ?bnf ?nom ?autreNom ?naissance ?mort ?genre ?infos ?infos2
+        SELECT ?id ?person (SAMPLE(?name) AS ?nom) (GROUP_CONCAT(DISTINCT ?sameAs; separator="\\t") AS ?ident)
+            (SAMPLE(?frbnf) AS ?bnf) (GROUP_CONCAT(DISTINCT ?altLabel; separator="\\t") AS ?autreNom)
+            (SAMPLE(?birth) AS ?naissance) (SAMPLE(?death) AS ?mort) (SAMPLE(?gender) AS ?genre)
+            (GROUP_CONCAT(DISTINCT ?p60492; separator="\\t") AS ?infos)
+            (GROUP_CONCAT(DISTINCT ?note; separator="\\t") AS ?infos2)
         WHERE {
-            ?person ?num <""" + identifier + """>. 
+            VALUES ?id { """ + " ".join("<" + identifier + ">" for identifier in items) + """ }
+            ?person ?num ?id. 
             ?person a foaf:Person;
-            foaf:name ?nom.
-            OPTIONAL {?person skos:altLabel ?autreNom}
-            OPTIONAL {?person owl:sameAs ?ident}
-            OPTIONAL {?person bnf-onto:FRBNF ?bnf}
-            OPTIONAL {?person bio:event [a bio:Birth ; bio:date ?naissance]}
-            OPTIONAL {?person bio:event [a bio:Death ; bio:date ?mort]} 
-            OPTIONAL {?person foaf:gender ?genre}
-            OPTIONAL {?person rdau:P60492 ?infos}
-            OPTIONAL {?person skos:note ?infos2}
+            foaf:name ?name.
+            {} 
+            UNION {?person skos:altLabel ?altLabel}
+            UNION {?person owl:sameAs ?sameAs}
+            UNION {?person bnf-onto:FRBNF ?frbnf}
+            UNION {?person bio:event [a bio:Birth ; bio:date ?birth]}
+            UNION {?person bio:event [a bio:Death ; bio:date ?death]} 
+            UNION {?person foaf:gender ?gender}
+            UNION {?person rdau:P60492 ?p60492}
+            UNION {?person skos:note ?note}
         }
-        """)
-
-    sparql.setReturnFormat(JSON)
+        GROUP BY ?id ?person
+        """
 
-    results = sparql.query().convert()
-    return results
 
+def get_sparql_batch(items, timeout=None, cache=None, bucket=None, session=None):
+    """
+    Effectue une seule requête SPARQL sur IdRef (sparql_query) pour plusieurs identifiants.
+    timeout est le délai maximal (en secondes) accordé à la requête. Si cache (SparqlCache) est donné, les résultats
+    y sont enregistrés identifiant par identifiant, sous la requête de cet identifiant seul : chaque identifiant est
+    d'abord cherché dans le cache, et seuls les identifiants absents sont envoyés à IdRef, de sorte que le cache
+    sert quel que soit le découpage des identifiants en paquets (autre --batch-size, reprise d'une récolte
+    interrompue). bucket (TokenBucket) limite le débit des requêtes envoyées à IdRef ; session est la session HTTP
+    à utiliser (open_session), la session du module (shared_session) sinon.
+    Retourne une liste contenant, pour chaque identifiant (dans l'ordre de items), un résultat au même format que
+    celui d'une requête SPARQL pour cet identifiant seul.
+    """
 
-def get_noms(printer):
+    responses = {}
+    if cache:
+        with profiler.stage("cache_read"):
+            for identifier in items:
+                cached = cache.get(sparql_query([identifier]))
+                if cached is not None:
+                    responses[identifier] = cached
+        profiler.count("cache_hits", len(responses))
+        profiler.count("cache_misses", len(items) - len(responses))
+
+    missing = [identifier for identifier in items if identifier not in responses]
+    if missing:
+        if cache and cache.offline:
+            raise CacheMiss("réponse absente du cache pour : " + ", ".join(missing))
+        if bucket:
+            with profiler.stage("rate_limit"):
+                bucket.take()
+        if session is None:
+            session = shared_session()
+        with profiler.stage("sparql"):
+            response = session.post(endpoint, data={"query": sparql_query(missing)}, timeout=timeout)
+        profiler.count("http_requests")
+        profiler.count("bytes_received", len(response.content))
+        response.raise_for_status()
+        with profiler.stage("json_decode"):
+            results = response.json()
+
+        # on répartit les résultats entre les identifiants, chacun sous la forme de la réponse à une requête pour
+        # cet identifiant seul
+        bindings = {identifier: [] for identifier in missing}
+        for binding in results["results"]["bindings"]:
+            identifier = binding["id"]["value"]
+            if identifier in bindings:
+                bindings[identifier].append(binding)
+        for identifier in missing:
+            responses[identifier] = {"head": results["head"], "results": {"bindings": bindings[identifier]}}
+        if cache:
+            with profiler.stage("cache_write"):
+                for identifier in missing:
+                    cache.put(sparql_query([identifier]), responses[identifier])
+
+    # GROUP_CONCAT renvoie une chaîne vide quand la propriété est absente : on supprime ces variables
+    return [{"head": responses[identifier]["head"],
+             "results": {"bindings": [{key: value for key, value in binding.items() if value["value"] != ""}
+                                      for binding in responses[identifier]["results"]["bindings"]]}}
+            for identifier in items]
+
+
+def get_sparql(item, timeout=None, cache=None):
     """
-    On récupère les différentes formes des noms des imprimeurs qu'on insère 
-    dans une liste
-    Retourne une liste
+    Avec cette fonction, pour chacun des identifiants récupérés dans la liste des imprimeurs, on effectue une requête 
+    SPARQL sur IdRef pour récupérer les informations qui lui sont liées.
+    timeout est le délai maximal (en secondes) accordé à la requête, cache le cache des réponses (SparqlCache).
     """
 
-    liste_noms = []
-    for item in printer["results"]["bindings"]:
-        if item not in liste_noms:
-            liste_noms.append(item["autreNom"]["value"])
+    return get_sparql_batch([item], timeout=timeout, cache=cache)[0]
 
-    liste_noms = list(dict.fromkeys(liste_noms))
 
-    return liste_noms
+class CacheMiss(Exception):
+    """
+    Levée en mode hors ligne quand la réponse à une requête n'est pas dans le cache.
+    """
 
 
-def get_idents(printer):
+class SparqlCache:
     """
-    On récupère les différents identifiants des imprimeurs qu'on insère 
-    dans une liste
-    Retourne une liste
+    Cache sur disque des réponses JSON de l'endpoint SPARQL : chaque réponse est enregistrée dans le dossier
+    directory, dans un fichier nommé d'après l'empreinte SHA-1 du texte normalisé de la requête (get_sparql_batch
+    enregistre une réponse par identifiant, sous la requête de cet identifiant seul). Une réponse plus
+    ancienne que ttl secondes est ignorée (None : jamais). En mode hors ligne (offline), les réponses sont utilisées
+    quel que soit leur âge et IdRef n'est jamais interrogé.
     """
 
-    liste_idents = []
-    for item in printer["results"]["bindings"]:
-        if item not in liste_idents:
-            liste_idents.append(item["ident"]["value"])
+    def __init__(self, directory=".sparql_cache", ttl=30 * 24 * 3600, offline=False):
+        self.directory = directory
+        self.ttl = ttl
+        self.offline = offline
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, query):
+        """
+        Retourne le chemin du fichier de cache d'une requête (espaces normalisés).
+        """
+
+        key = hashlib.sha1(" ".join(query.split()).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, query):
+        """
+        Retourne la réponse enregistrée pour la requête, ou None si elle est absente ou trop ancienne.
+        """
+
+        path = self.path(query)
+        try:
+            if not self.offline and self.ttl is not None and time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, encoding="utf-8") as cached:
+                return json.load(cached)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, query, results):
+        """
+        Enregistre la réponse d'une requête (écriture dans un fichier temporaire puis renommage, pour ne jamais
+        laisser de fichier incomplet).
+        """
+
+        path = self.path(query)
+        temporary = "%s.%d.tmp" % (path, threading.get_ident())
+        with open(temporary, "w", encoding="utf-8") as cached:
+            json.dump(results, cached, ensure_ascii=False)
+        os.replace(temporary, path)
+
+
+class TokenBucket:
+    """
+    Limiteur de débit partagé entre les threads : au plus rate requêtes par seconde en moyenne, avec des rafales
+    d'au plus burst requêtes.
+    """
 
-    liste_idents = list(dict.fromkeys(liste_idents))
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """
+        Attend qu'un jeton soit disponible, puis le consomme.
+        """
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, delay):
+        """
+        Suspend les requêtes de tous les threads pendant delay secondes (en-tête Retry-After de l'endpoint).
+        """
+
+        with self.lock:
+            self.tokens = 0
+            self.updated = max(self.updated, time.monotonic() + delay)
+
+
+def is_transient(error):
+    """
+    Indique si une erreur de requête est passagère : délai dépassé, erreur de connexion, ou réponse HTTP 429 ou
+    5xx (transient_statuses).
+    """
 
-    return liste_idents
+    if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+        return True
+    response = getattr(error, "response", None)
+    return isinstance(error, requests.HTTPError) and response is not None \
+        and response.status_code in transient_statuses
 
 
-def get_infos(printer):
+def retry_after(error):
     """
-    On récupère les différentes informations sur les imprimeurs qu'on insère 
-    dans une liste
-    Correspond à "infos" dans la requête SPARQL
-    Retourne une liste
+    Lit l'en-tête Retry-After d'une réponse 429 ou 503 (nombre de secondes ou date HTTP).
+    Retourne le délai à attendre en secondes, ou None si l'en-tête est absent ou illisible.
     """
 
-    liste_infos = []
-    for item in printer["results"]["bindings"]:
-        if item not in liste_infos:
-            liste_infos.append(item["infos"]["value"])
+    response = getattr(error, "response", None)
+    if response is None or response.status_code not in (429, 503):
+        return None
+    value = response.headers.get("Retry-After", "").strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def get_sparql_retry(items, bucket=None, retries=3, backoff=1.0, timeout=30, cache=None, session=None):
+    """
+    Effectue la requête SPARQL d'un paquet d'identifiants (get_sparql_batch) en respectant le limiteur de débit
+    bucket, et la relance jusqu'à retries fois en cas d'erreur passagère (is_transient), avec une attente
+    exponentielle (backoff, 2 x backoff, 4 x backoff...). Si l'endpoint indique un délai (Retry-After), on
+    l'attend, et toutes les requêtes sont suspendues pendant ce délai. Les autres erreurs sont levées aussitôt.
+    Retourne la liste des résultats, un par identifiant.
+    """
 
-    liste_infos = list(dict.fromkeys(liste_infos))
+    for attempt in range(retries + 1):
+        try:
+            return get_sparql_batch(items, timeout=timeout, cache=cache, bucket=bucket, session=session)
+        except requests.RequestException as error:
+            profiler.count("request_errors")
+            if attempt == retries or not is_transient(error):
+                raise
+            delay = retry_after(error)
+            if delay is None:
+                time.sleep(backoff * 2 ** attempt * (1 + random.random() / 2))
+            elif bucket:
+                # la prochaine tentative attendra le limiteur de débit, comme les requêtes des autres threads
+                bucket.pause(delay)
+            else:
+                time.sleep(delay)
+
+
+def iter_harvest(identifiants, concurrency=4, rate=2.0, retries=3, timeout=30, batch_size=1, cache=None):
+    """
+    Lance les requêtes SPARQL de tous les identifiants en parallèle, dans au plus concurrency threads, sans
+    dépasser rate requêtes par seconde vers data.idref.fr. Chaque requête porte sur batch_size identifiants, a un
+    délai maximal de timeout secondes et est relancée jusqu'à retries fois en cas d'erreur. Les réponses déjà
+    présentes dans cache (SparqlCache) ne sont pas redemandées. Tous les threads partagent une même session HTTP,
+    dont le pool compte une connexion par thread.
+    Générateur : renvoie les couples (identifiant, résultat) dans l'ordre des identifiants, au fur et à mesure que
+    les réponses arrivent. Au plus 2 x concurrency paquets sont en cours à la fois, pour que la mémoire utilisée ne
+    dépende pas du nombre d'identifiants.
+    """
+
+    bucket = TokenBucket(rate, burst=concurrency)
+    session = open_session(concurrency)
+    with session, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = deque()
+        for i in range(0, len(identifiants), batch_size):
+            batch = identifiants[i:i + batch_size]
+            pending.append((batch, executor.submit(get_sparql_retry, batch, bucket, retries=retries, timeout=timeout,
+                                                   cache=cache, session=session)))
+            if len(pending) >= 2 * concurrency:
+                batch, future = pending.popleft()
+                yield from zip(batch, future.result())
+        while pending:
+            batch, future = pending.popleft()
+            yield from zip(batch, future.result())
+
+
+def harvest(identifiants, **options):
+    """
+    Lance les requêtes SPARQL de tous les identifiants (voir iter_harvest pour les options).
+    Retourne la liste des résultats, dans l'ordre des identifiants.
+    """
 
-    return liste_infos
+    return [result for identifier, result in iter_harvest(identifiants, **options)]
 
 
-def get_infos2(printer):
+def aggregate_bindings(printer):
     """
-    On récupère les différentes informations sur les imprimeurs qu'on insère 
-    dans une liste
-    Correspond à "infos2" dans la requête SPARQL
-    Retourne une liste
+    Parcourt une seule fois les résultats SPARQL d'un imprimeur et regroupe les valeurs de chaque variable, sans
+    doublons et dans l'ordre d'apparition. Les valeurs des variables regroupées par GROUP_CONCAT sont séparées.
+    Retourne un dictionnaire :
+    - en clé = le nom de la variable SPARQL
+    - en valeur = un dictionnaire dont les clés sont les valeurs (utilisé comme ensemble ordonné)
     """
 
-    liste_autresinfos = []
+    values = {}
     for item in printer["results"]["bindings"]:
-        if item["nom"]["value"] == "Cotinet, Arnoul":
-            pass
+        for variable, value in item.items():
+            if variable in grouped:
+                values.setdefault(variable, {}).update(dict.fromkeys(value["value"].split(separator)))
+            else:
+                values.setdefault(variable, {})[value["value"]] = None
+
+    return values
+
+
+def get_row(printer):
+    """
+    Construit la ligne du TSV d'un imprimeur à partir de ses résultats SPARQL, en suivant la description des
+    colonnes (columns) : première valeur de la variable ou liste de toutes ses valeurs, None si elle est absente.
+    Retourne une liste.
+    """
+
+    values = aggregate_bindings(printer)
+    # les notes IdRef de Cotinet, Arnoul ne sont pas reprises
+    if "Cotinet, Arnoul" in values.get("nom", {}):
+        values.pop("infos2", None)
+
+    row = []
+    for fieldname, variable, multiple in columns:
+        variable_values = list(values.get(variable, ()))
+        if not variable_values:
+            row.append(None)
+        elif multiple:
+            row.append(variable_values)
         else:
-            liste_autresinfos.append(item["infos2"]["value"])
+            row.append(variable_values[0])
 
-    liste_autresinfos = list(dict.fromkeys(liste_autresinfos))
+    return row
 
-    return liste_autresinfos
 
+def read_journal(journal):
+    """
+    Lit le journal d'une récolte interrompue.
+    Retourne l'ensemble des identifiants déjà traités (vide s'il n'y a pas de journal).
+    """
 
-def get_all():
+    try:
+        with open(journal) as journalfile:
+            return {line.rstrip("\n") for line in journalfile if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def get_all(results, path=tsv_path, journal='base_imprimeurs_sparql.journal', resume=False):
     """
     Cette fonction écrit les informations des imprimeurs dans un fichier CSV.
     Chaque imprimeur correspond à une ligne du CSV, chaque information (dates, noms...) correspond à 
     une colonne.
+    results est un itérable de couples (identifiant, résultat SPARQL) : chaque ligne est écrite dès que son
+    résultat arrive, et l'identifiant est ensuite ajouté au journal. Si resume est vrai, les lignes sont ajoutées
+    au fichier existant (reprise d'une récolte interrompue) ; le fichier doit alors exister, sinon les lignes des
+    identifiants du journal seraient perdues. Le journal est supprimé une fois la récolte terminée.
     """
 
-    with open('base_imprimeurs_sparql.tsv', 'w+', newline='') as newfile:
-        fieldnames = ["Nom", "Lien_IdRef", "Identifiants", "Identifiant_BnF", "Autres_formes_du_Nom", "Naissance",
-                      "Mort", "Genre", "Informations", "Autres_Informations"]
+    if resume and not os.path.exists(path):
+        raise FileNotFoundError("reprise impossible : %s est absent, alors que le journal %s indique des "
+                                "identifiants déjà traités" % (path, journal))
+    with open(path, 'a' if resume else 'w+', newline='') as newfile, \
+            open(journal, 'a' if resume else 'w') as journalfile:
         writer = csv.writer(newfile, delimiter='\t')
-        writer.writerow(fieldname for fieldname in fieldnames)
+        if not resume:
+            fieldnames = [fieldname for fieldname, variable, multiple in columns]
+            writer.writerow(fieldname for fieldname in fieldnames)
 
         # On récupère les informations des imprimeurs pour ceux qui en ont (les résultats vides, c'est-à-dire 
         # ceux qui n'ont pas de notice sur IdRef, sont ignorés).
-        # Pour chacun d'entre eux, on vérifie la présence ou l'absence de l'information.
-        # Si l'information est présente, on l'ajoute dans la colonne.
-        # Sinon, on insère un None.
-        # Les appels de fonctions dans les colonnes permettent d'ajouter les informations qui sont sous forme de
-        # listes (autres formes du nom, identifiants, informations)
-
-        for element in liste_result:
+        # Si une information est absente, on insère un None dans sa colonne. Les informations qui peuvent avoir
+        # plusieurs valeurs (autres formes du nom, identifiants, informations) sont écrites sous forme de listes.
+        for identifier, element in results:
             if len(element["results"]["bindings"]) >= 1:
-                nom = element["results"]["bindings"][0]["nom"]["value"]
-                person = element["results"]["bindings"][0]["person"]["value"]
-                imprimeur = element["results"]["bindings"][0]
-                if "bnf" in imprimeur:
-                    if "autreNom" in imprimeur:
-                        if "naissance" in imprimeur:
-                            if "mort" in imprimeur:
-                                if "genre" in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element),
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element),
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element),
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element),
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             None, None])
-                                elif "genre" not in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element),
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], None,
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element),
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], None,
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element),
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], None,
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element),
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], None, None, None])
-                            else:
-                                writer.writerow([nom, person, get_idents(element), imprimeur["bnf"]["value"],
-                                                get_noms(element), imprimeur["naissance"]["value"],
-                                                 None, None, None, None])
-                        elif "naissance" not in imprimeur:
-                            if "mort" in imprimeur:
-                                if "genre" in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element), None,
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element), None,
-                                                             imprimeur["mort"]["value"],
-                                                             imprimeur["genre"]["value"],
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element), None,
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element), None,
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             None, None])
-                                elif "genre" not in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element), None,
-                                                             imprimeur["mort"]["value"], None,
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element), None,
-                                                             imprimeur["mort"]["value"], None,
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element), None,
-                                                             imprimeur["mort"]["value"], None,
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element), None,
-                                                             imprimeur["mort"]["value"], None, None, None])
-                            if "mort" not in imprimeur:
-                                if "genre" in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element), None,
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element), None,
-                                                             imprimeur["mort"]["value"],
-                                                             imprimeur["genre"]["value"],
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element), None,
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element), None,
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             None, None])
-                                elif "genre" not in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element), None, None, None,
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element), None, None, None,
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element), None, None, None,
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"],
-                                                             get_noms(element), None, None, None, None, None])
-
-                    elif "autreNom" not in imprimeur:
-                        if "naissance" in imprimeur:
-                            if "mort" in imprimeur:
-                                if "genre" in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None,
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None,
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None,
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"],
-                                                             imprimeur["genre"]["value"],
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None,
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             None, None])
-                                elif "genre" not in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None,
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], None,
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None,
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], None,
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None,
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], None,
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None,
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], None, None, None])
-                            else:
-                                writer.writerow([nom, person, get_idents(element), imprimeur["bnf"]["value"], None,
-                                                imprimeur["naissance"]["value"], None, None, None, None])
-                        elif "naissance" not in imprimeur:
-                            if "mort" in imprimeur:
-                                if "genre" in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None, None,
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None, None,
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None, None,
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None, None,
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             None, None])
-                                elif "genre" not in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None, None,
-                                                             imprimeur["mort"]["value"], None,
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None, None,
-                                                             imprimeur["mort"]["value"], None,
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None, None,
-                                                             imprimeur["mort"]["value"], None,
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None, None,
-                                                             imprimeur["mort"]["value"], None, None, None])
-                            elif "mort" not in imprimeur:
-                                if "genre" in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None, None,
-                                                             None, imprimeur["genre"]["value"],
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None, None,
-                                                             None, imprimeur["genre"]["value"],
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None, None,
-                                                             None, imprimeur["genre"]["value"],
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None, None,
-                                                             None, imprimeur["genre"]["value"],
-                                                             None, None])
-                                elif "genre" not in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None, None,
-                                                             None, None,
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None, None, None, None,
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None, None, None, None,
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element),
-                                                             imprimeur["bnf"]["value"], None, None,
-                                                             None, None, None, None])
-                    else:
-                        writer.writerow([nom, person, get_idents(element), imprimeur["bnf"]["value"]])
-
-                elif "bnf" not in imprimeur:
-                    if "autreNom" in imprimeur:
-                        if "naissance" in imprimeur:
-                            if "mort" in imprimeur:
-                                if "genre" in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, None, get_noms(element),
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             None, None])
-                                elif "genre" not in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], None,
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], None,
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], None,
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], None, None, None])
-                            else:
-                                writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                imprimeur["naissance"]["value"], None, None, None, None])
-                        if "naissance" not in imprimeur:
-                            if "mort" in imprimeur:
-                                if "genre" in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             None, imprimeur["mort"]["value"],
-                                                             imprimeur["genre"]["value"], get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             None, imprimeur["mort"]["value"],
-                                                             imprimeur["genre"]["value"],
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             None, imprimeur["mort"]["value"],
-                                                             imprimeur["genre"]["value"],
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             None,
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             None, None])
-                                elif "genre" not in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             None, imprimeur["mort"]["value"], None,
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             None, imprimeur["mort"]["value"], None,
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             None, imprimeur["mort"]["value"], None,
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None,  get_noms(element),
-                                                             None, imprimeur["mort"]["value"], None, None, None])
-                            elif "mort" not in imprimeur:
-                                if "genre" in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             None, None,
-                                                             imprimeur["genre"]["value"], get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             None, None, imprimeur["genre"]["value"],
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             None, None, imprimeur["genre"]["value"],
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             None, None, imprimeur["genre"]["value"],
-                                                             None, None])
-                                elif "genre" not in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             None, None, None, get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             None, None, None, get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, get_noms(element),
-                                                             None, None, None, None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None,  get_noms(element),
-                                                             None, None, None, None, None])
-
-                    elif "autreNom" not in imprimeur:
-                        if "naissance" in imprimeur:
-                            if "mort" in imprimeur:
-                                if "genre" in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, None,
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, None,
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, None,
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, None,
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             None, None])
-                                elif "genre" not in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, None,
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], None,
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, None,
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], None,
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, None,
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], None,
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, None,
-                                                             imprimeur["naissance"]["value"],
-                                                             imprimeur["mort"]["value"], None, None, None])
-                            else:
-                                writer.writerow([nom, person, get_idents(element), None, None,
-                                                 imprimeur["naissance"]["value"], None,
-                                                 None, None, None])
-
-                        elif "naissance" not in imprimeur:
-                            if "mort" in imprimeur:
-                                if "genre" in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, None, None,
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, None, None,
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, None, None,
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, None, None,
-                                                             imprimeur["mort"]["value"], imprimeur["genre"]["value"],
-                                                             None, None])
-                                elif "genre" not in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, None, None,
-                                                             imprimeur["mort"]["value"], None,
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, None, None,
-                                                             imprimeur["mort"]["value"], None,
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, None, None,
-                                                             imprimeur["mort"]["value"], None,
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, None, None,
-                                                             imprimeur["mort"]["value"], None, None, None])
-                            if "mort" not in imprimeur:
-                                if "genre" in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, None, None,
-                                                             None, imprimeur["genre"]["value"],
-                                                             get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, None, None,
-                                                             None, imprimeur["genre"]["value"],
-                                                             get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, None, None,
-                                                             None, imprimeur["genre"]["value"],
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, None, None,
-                                                             None, imprimeur["genre"]["value"], None, None])
-                                elif "genre" not in imprimeur:
-                                    if "infos" in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, None, None,
-                                                             None, None, get_infos(element),
-                                                             get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, None, None,
-                                                             None, None, get_infos(element), None])
-                                    elif "infos" not in imprimeur:
-                                        if "infos2" in imprimeur:
-                                            writer.writerow([nom, person, get_idents(element), None, None, None,
-                                                             None, None,
-                                                             None, get_infos2(element)])
-                                        else:
-                                            writer.writerow([nom, person, get_idents(element), None, None, None,
-                                                             None, None, None, None])
-
-                    else:
-                        writer.writerow([nom, person, get_idents(element), None, None, None, None, None, None, None])
-
+                with profiler.stage("write_tsv"):
+                    writer.writerow(get_row(element))
+                    newfile.flush()
+                profiler.count("rows_written")
+            journalfile.write(identifier + "\n")
+            journalfile.flush()
+
+    os.remove(journal)
     return
 
 
 if __name__ == "__main__":
-
-    liste_id = get_data()
-
-    liste_result = []
-    for identifiant in liste_id:
-        result = get_sparql(identifiant)
-        liste_result.append(result)
-    get_all()
+    argparser = argparse.ArgumentParser(description="Récupération des informations des imprimeurs sur IdRef")
+    argparser.add_argument("-c", "--concurrency", type=int, default=4,
+                           help="nombre de requêtes SPARQL simultanées (4 par défaut)")
+    argparser.add_argument("-r", "--rate", type=float, default=2.0,
+                           help="nombre maximal de requêtes par seconde (2 par défaut)")
+    argparser.add_argument("--retries", type=int, default=3,
+                           help="nombre de nouvelles tentatives en cas d'erreur (3 par défaut)")
+    argparser.add_argument("--timeout", type=float, default=30,
+                           help="délai maximal d'une requête, en secondes (30 par défaut)")
+    argparser.add_argument("-b", "--batch-size", type=int, default=20,
+                           help="nombre d'identifiants par requête SPARQL (20 par défaut)")
+    argparser.add_argument("--cache-dir", default=".sparql_cache",
+                           help="dossier du cache des réponses SPARQL (.sparql_cache par défaut)")
+    argparser.add_argument("--no-cache", dest="cache_dir", action="store_const", const=None,
+                           help="interroge IdRef sans utiliser de cache")
+    argparser.add_argument("--ttl", type=float, default=30,
+                           help="durée de validité des réponses en cache, en jours (30 par défaut)")
+    argparser.add_argument("--offline", action="store_true",
+                           help="utilise seulement les réponses en cache, sans interroger IdRef")
+    argparser.add_argument("--endpoint", default=endpoint,
+                           help="adresse de l'endpoint SPARQL (%s par défaut)" % endpoint)
+    argparser.add_argument("--journal", default="base_imprimeurs_sparql.journal",
+                           help="journal des identifiants traités, pour reprendre une récolte interrompue")
+    argparser.add_argument("--profile", nargs="?", const="base_imprimeurs_sparql.profile.json", metavar="FICHIER",
+                           help="mesure la durée, les compteurs et le pic de mémoire de chaque étape et écrit le "
+                                "rapport en JSON (base_imprimeurs_sparql.profile.json par défaut)")
+    args = argparser.parse_args()
+    endpoint = args.endpoint
+
+    if args.profile:
+        profiler.start()
+
+    cache = None
+    if args.cache_dir:
+        cache = SparqlCache(args.cache_dir, ttl=args.ttl * 24 * 3600, offline=args.offline)
+    elif args.offline:
+        argparser.error("--offline nécessite le cache")
+
+    # reprise d'une récolte interrompue : on passe les identifiants déjà écrits dans le TSV
+    done = read_journal(args.journal)
+    if done and not os.path.exists(tsv_path):
+        argparser.error("le journal %s indique une récolte interrompue, mais %s est absent : supprimez le journal "
+                        "pour tout récolter à nouveau" % (args.journal, tsv_path))
+    with profiler.stage("read_identifiers"):
+        liste_id = [identifiant for identifiant in get_data() if identifiant not in done]
+    profiler.count("identifiers", len(liste_id))
+
+    results = iter_harvest(liste_id, concurrency=args.concurrency, rate=args.rate, retries=args.retries,
+                           timeout=args.timeout, batch_size=args.batch_size, cache=cache)
+    get_all(results, journal=args.journal, resume=bool(done))
+    if args.profile:
+        profiler.write(args.profile)
@@ -0,0 +1,338 @@
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from lxml import etree
+
+import printers_to_tei
+from identifiers import to_uri
+from printers_to_tei import ns, xml_id, get_xmlid, index_printers
+
+
+# Banc d'essai de la génération des fiches d'imprimeurs : le corpus des mazarinades n'étant pas dans le dépôt, on
+# génère un corpus synthétique de N fichiers TEI ayant la forme de ceux que lit get_maz_metadata (<publisher> avec
+# ou sans @ref, auteurs, pages, lieu de conservation, marques d'imprimeur dans le texte), dont les <publisher>
+# renvoient aux imprimeurs de la base imprimeurs selon une répartition choisie. Les étapes de la génération sont
+# chronométrées pour plusieurs tailles de corpus ; les résultats peuvent être enregistrés comme référence, et une
+# exécution comparée à cette référence échoue si une étape est devenue nettement plus lente.
+
+tei = "{%s}" % ns['tei']
+phases = ["index_printers", "index_mazarinades", "index_mazarinades_stream", "to_tei", "to_tei_unchanged",
+          "to_tei_cached", "to_tei_incremental", "add_empty_maz"]
+institutions = [("Paris", "Bibliothèque Mazarine"), ("Paris", "Bibliothèque nationale de France"),
+                ("Paris", "Bibliothèque de l'Arsenal"), ("Lyon", "Bibliothèque municipale"),
+                ("Rouen", "Bibliothèque municipale")]
+words = ("le roi la reine cardinal Mazarin parlement Paris peuple prince Condé requête avis lettre discours "
+         "remontrance très humble paix guerre noblesse bourgeois frondeur arrêt déclaration").split()
+
+
+def read_printers(path):
+    """
+    Lit la base imprimeurs et prépare, pour chaque imprimeur, les valeurs utilisables dans les <publisher> des
+    mazarinades synthétiques : sa clé (colonne ISNI, ou à défaut son @xml:id), la forme de son identifiant
+    utilisée dans les mazarinades (isni:...), les adresses de ses autres identifiants (VIAF, ARK de la BnF, IdRef)
+    et la forme de son nom dans une adresse typographique ("chez Gervais Alliot").
+    Retourne la liste des imprimeurs (dictionnaires).
+    """
+
+    crosswalk = index_printers(path)[0]
+    printers = []
+    with open(path) as csvfile:
+        csvreader = csv.reader(csvfile, delimiter="\t")
+        next(csvreader, None)
+        for row in csvreader:
+            key = row[14] or get_xmlid(row)
+            printers.append({
+                "key": key,
+                "ref": row[14] or None,
+                "uris": [to_uri(identifier) for identifier in crosswalk.identifiers.get(key, ())],
+                "name": "chez %s %s" % (row[1], row[0]) if row[1] else "chez " + row[0],
+            })
+    return printers
+
+
+def printer_weights(count, distribution="zipf", skew=1.1):
+    """
+    Calcule les poids de tirage des imprimeurs :
+    - uniform : tous les imprimeurs ont le même poids
+    - zipf : le poids du k-ième imprimeur est 1 / k ** skew (quelques imprimeurs très productifs, comme dans le
+      corpus réel)
+    - single : toutes les mazarinades sont du premier imprimeur (une seule fiche très longue)
+    Retourne la liste des poids cumulés.
+    """
+
+    if distribution == "uniform":
+        weights = [1.0] * count
+    elif distribution == "zipf":
+        weights = [1.0 / rank ** skew for rank in range(1, count + 1)]
+    elif distribution == "single":
+        weights = [1.0] + [0.0] * (count - 1)
+    else:
+        raise ValueError("répartition inconnue : %s" % distribution)
+    cumulated, total = [], 0.0
+    for weight in weights:
+        total += weight
+        cumulated.append(total)
+    return cumulated
+
+
+def synthetic_mazarinade(number, publishers, rng, paragraphs=20):
+    """
+    Construit le document TEI d'une mazarinade synthétique ; publishers est la liste des couples (@ref ou None,
+    texte) de ses <publisher>.
+    Retourne l'élément <TEI>.
+    """
+
+    root = etree.Element(tei + "TEI", nsmap={None: ns['tei']})
+    root.set(xml_id, "Synth%d_MAZ" % number)
+    header = etree.SubElement(root, tei + "teiHeader")
+    filedesc = etree.SubElement(header, tei + "fileDesc")
+    titlestmt = etree.SubElement(filedesc, tei + "titleStmt")
+    title = etree.SubElement(titlestmt, tei + "title", type="main")
+    title.text = " ".join(rng.choice(words) for _ in range(rng.randint(5, 15))).capitalize()
+    sourcedesc = etree.SubElement(filedesc, tei + "sourceDesc")
+
+    bibl = etree.SubElement(sourcedesc, tei + "bibl")
+    for _ in range(rng.choice((0, 1, 1, 2))):
+        author = etree.SubElement(bibl, tei + "author")
+        if rng.random() < 0.5:
+            author.set("ref", "isni:%016d" % rng.randrange(10 ** 15))
+        author.text = rng.choice(("Anonyme", "Dubosc-Montandré", "Sandricourt", "Naudé"))
+    pubplace = etree.SubElement(bibl, tei + "pubPlace")
+    pubplace.text = "Paris"
+    for ref, text in publishers:
+        publisher = etree.SubElement(bibl, tei + "publisher")
+        if ref:
+            publisher.set("ref", ref)
+        publisher.text = text
+    if rng.random() < 0.9:
+        extent = etree.SubElement(bibl, tei + "extent")
+        etree.SubElement(extent, tei + "measure", unit="pages", quantity=str(rng.choice((4, 7, 8, 8, 12, 16, 24, 32))))
+    if rng.random() < 0.9:
+        etree.SubElement(bibl, tei + "ref", target="https://antonomaz.huma-num.fr/mazarinade/%d" % number)
+
+    settlement_text, institution_text = rng.choice(institutions)
+    msidentifier = etree.SubElement(etree.SubElement(sourcedesc, tei + "msDesc"), tei + "msIdentifier")
+    etree.SubElement(msidentifier, tei + "settlement").text = settlement_text
+    etree.SubElement(msidentifier, tei + "institution").text = institution_text
+
+    body = etree.SubElement(etree.SubElement(root, tei + "text"), tei + "body")
+    for position in range(paragraphs):
+        p = etree.SubElement(body, tei + "p")
+        p.text = " ".join(rng.choice(words) for _ in range(60))
+        if position == 0:
+            for _ in range(rng.choice((0, 1, 1, 2))):
+                etree.SubElement(p, tei + "figure", type="decoration")
+    return root
+
+
+def generate_corpus(directory, count, printers, distribution="zipf", skew=1.1, unlinked=0.1, variants=0.2,
+                    paragraphs=20, seed=0):
+    """
+    Écrit count mazarinades synthétiques dans directory (par dossiers de 1000 fichiers, comme ./Mazarinades/**/).
+    Chaque mazarinade a un ou deux imprimeurs, tirés selon la répartition distribution (printer_weights) :
+    - avec la probabilité unlinked, le <publisher> n'a pas de @ref et ne contient que le nom de l'imprimeur (pour
+      --link-names)
+    - avec la probabilité variants, son @ref est une autre forme de l'identifiant (adresse VIAF, ARK de la BnF,
+      IdRef), que printers_to_tei.py ramène à l'imprimeur avec la table de correspondance
+    - sinon, son @ref est l'identifiant isni:... de l'imprimeur
+    Le tirage est déterministe (seed).
+    Retourne la liste des fichiers écrits.
+    """
+
+    rng = random.Random(seed)
+    order = list(printers)
+    rng.shuffle(order)
+    cumulated = printer_weights(len(order), distribution, skew)
+    files = []
+    for number in range(count):
+        publishers = []
+        for printer in rng.choices(order, cum_weights=cumulated, k=rng.choice((1, 1, 1, 1, 2))):
+            draw = rng.random()
+            if draw < unlinked or not (printer["ref"] or printer["uris"]):
+                publishers.append((None, printer["name"]))
+            elif draw < unlinked + variants and printer["uris"]:
+                publishers.append((rng.choice(printer["uris"]), printer["name"]))
+            else:
+                publishers.append((printer["ref"] or printer["uris"][0], printer["name"]))
+        folder = os.path.join(directory, "%04d" % (number // 1000))
+        if number % 1000 == 0:
+            os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, "Synth%d.xml" % number)
+        etree.ElementTree(synthetic_mazarinade(number, publishers, rng, paragraphs)).write(
+            path, encoding="utf-8", xml_declaration=True)
+        files.append(path)
+    return files
+
+
+def timed(function, *args, **kwargs):
+    """
+    Exécute une fonction et mesure sa durée.
+    Retourne le couple (durée en secondes, résultat).
+    """
+
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run_phases(workspace, workers=1, link_names=False, repeat=1):
+    """
+    Chronomètre les étapes de la génération des fiches dans un espace de travail préparé (dossier scripts/
+    contenant Mazarinades/ et printers_Antonomaz/, base imprimeurs dans CSV/Antonomaz/) :
+    - index_printers, index_mazarinades (lecture complète et en flux) : construction des index
+    - to_tei : génération de toutes les fiches ; to_tei_unchanged : nouvelle génération, sans fichier à réécrire
+    - to_tei_cached : génération avec un cache vide ; to_tei_incremental : génération incrémentale, cache à jour
+    - add_empty_maz : vérification de toutes les fiches
+    Chaque étape est répétée repeat fois et on garde la durée la plus courte.
+    Retourne un dictionnaire étape -> durée en secondes.
+    """
+
+    previous = os.getcwd()
+    os.chdir(os.path.join(workspace, "scripts"))
+    try:
+        tsv = "../CSV/Antonomaz/base_imprimeurs_joined.tsv"
+        cache = ".mazarinades_cache.sqlite"
+
+        def fresh_output():
+            shutil.rmtree("printers_Antonomaz", ignore_errors=True)
+            os.mkdir("printers_Antonomaz")
+
+        def fresh_cache():
+            if os.path.exists(cache):
+                os.remove(cache)
+
+        crosswalk, names = index_printers(tsv, link_names=link_names)
+        steps = {
+            "index_printers": (None, lambda: index_printers(tsv, link_names=link_names)),
+            "index_mazarinades": (None, lambda: printers_to_tei.index_mazarinades(
+                workers=workers, crosswalk=crosswalk, names=names)),
+            "index_mazarinades_stream": (None, lambda: printers_to_tei.index_mazarinades(
+                workers=workers, stream=True, crosswalk=crosswalk, names=names)),
+            "to_tei": (fresh_output, lambda: printers_to_tei.to_tei(workers=workers, link_names=link_names)),
+            "to_tei_unchanged": (None, lambda: printers_to_tei.to_tei(workers=workers, link_names=link_names)),
+            "to_tei_cached": (fresh_cache, lambda: printers_to_tei.to_tei(
+                workers=workers, cache=cache, incremental=True, link_names=link_names)),
+            "to_tei_incremental": (None, lambda: printers_to_tei.to_tei(
+                workers=workers, cache=cache, incremental=True, link_names=link_names)),
+            "add_empty_maz": (None, printers_to_tei.add_empty_maz),
+        }
+
+        results = {}
+        for phase in phases:
+            setup, step = steps[phase]
+            durations = []
+            for _ in range(repeat):
+                if setup is not None:
+                    setup()
+                durations.append(timed(step)[0])
+            results[phase] = min(durations)
+        return results
+    finally:
+        os.chdir(previous)
+
+
+def prepare_workspace(root, tsv):
+    """
+    Prépare un espace de travail reproduisant les chemins relatifs utilisés par printers_to_tei.py.
+    Retourne le dossier des mazarinades à générer.
+    """
+
+    os.makedirs(os.path.join(root, "CSV", "Antonomaz"), exist_ok=True)
+    shutil.copy(tsv, os.path.join(root, "CSV", "Antonomaz", "base_imprimeurs_joined.tsv"))
+    os.makedirs(os.path.join(root, "scripts", "printers_Antonomaz"), exist_ok=True)
+    corpus = os.path.join(root, "scripts", "Mazarinades")
+    shutil.rmtree(corpus, ignore_errors=True)
+    return corpus
+
+
+def compare(results, baseline, tolerance=0.25, minimum=0.05):
+    """
+    Compare des résultats à une référence : une étape est en régression si sa durée dépasse celle de la référence de
+    plus de tolerance (25 % par défaut) et d'au moins minimum secondes (pour ignorer le bruit des étapes très
+    courtes). Seules les tailles et les étapes présentes des deux côtés sont comparées.
+    Retourne la liste des régressions (taille, étape, durée de référence, durée mesurée).
+    """
+
+    regressions = []
+    for size, timings in results["sizes"].items():
+        reference = baseline.get("sizes", {}).get(size, {})
+        for phase, duration in timings.items():
+            if phase in reference and duration > reference[phase] * (1 + tolerance) \
+                    and duration - reference[phase] >= minimum:
+                regressions.append((size, phase, reference[phase], duration))
+    return regressions
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Banc d'essai de la génération des fiches d'imprimeurs sur un "
+                                                    "corpus synthétique de mazarinades")
+    argparser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                           help="nombres de mazarinades générées (1000 10000 100000 par défaut)")
+    argparser.add_argument("--tsv", default="../CSV/Antonomaz/base_imprimeurs_joined.tsv",
+                           help="TSV de la base imprimeurs")
+    argparser.add_argument("--distribution", choices=["uniform", "zipf", "single"], default="zipf",
+                           help="répartition des mazarinades entre les imprimeurs (zipf par défaut)")
+    argparser.add_argument("--skew", type=float, default=1.1, help="exposant de la répartition zipf (1.1 par défaut)")
+    argparser.add_argument("--unlinked", type=float, default=0.1,
+                           help="proportion de <publisher> sans @ref (0.1 par défaut)")
+    argparser.add_argument("--variants", type=float, default=0.2,
+                           help="proportion de @ref sous une autre forme que isni:... (0.2 par défaut)")
+    argparser.add_argument("--paragraphs", type=int, default=20, help="nombre de <p> par mazarinade (20 par défaut)")
+    argparser.add_argument("--seed", type=int, default=0, help="graine du générateur (0 par défaut)")
+    argparser.add_argument("-w", "--workers", type=int, default=1, help="nombre de processus (1 par défaut)")
+    argparser.add_argument("--link-names", action="store_true", help="relie aussi les <publisher> sans @ref")
+    argparser.add_argument("--repeat", type=int, default=1, help="répétitions de chaque étape (1 par défaut)")
+    argparser.add_argument("--keep", metavar="DOSSIER", help="espace de travail à conserver (temporaire par défaut)")
+    argparser.add_argument("--save", metavar="FICHIER", help="enregistre les résultats comme référence")
+    argparser.add_argument("--compare", metavar="FICHIER",
+                           help="compare les résultats à une référence et échoue en cas de régression")
+    argparser.add_argument("--tolerance", type=float, default=0.25,
+                           help="ralentissement toléré par rapport à la référence (0.25 par défaut)")
+    args = argparser.parse_args()
+
+    printers = read_printers(args.tsv)
+    root = args.keep or tempfile.mkdtemp(prefix="benchmark_")
+    results = {
+        "python": sys.version.split()[0],
+        "lxml": ".".join(str(part) for part in etree.LXML_VERSION),
+        "options": {"distribution": args.distribution, "skew": args.skew, "unlinked": args.unlinked,
+                    "variants": args.variants, "paragraphs": args.paragraphs, "seed": args.seed,
+                    "workers": args.workers, "link_names": args.link_names},
+        "sizes": {},
+    }
+    try:
+        for size in args.sizes:
+            corpus = prepare_workspace(root, args.tsv)
+            generation, _ = timed(generate_corpus, corpus, size, printers, args.distribution, args.skew,
+                                  args.unlinked, args.variants, args.paragraphs, args.seed)
+            print("%d mazarinades générées en %.1f s" % (size, generation))
+            results["sizes"][str(size)] = run_phases(root, args.workers, args.link_names, args.repeat)
+            for phase, duration in results["sizes"][str(size)].items():
+                print("  %-26s %8.3f s" % (phase, duration))
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    if args.save:
+        with open(args.save, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as reference:
+            baseline = json.load(reference)
+        if baseline.get("options") != results["options"]:
+            print("attention : la référence a été mesurée avec d'autres options")
+        regressions = compare(results, baseline, args.tolerance)
+        for size, phase, before, after in regressions:
+            print("régression : %s mazarinades, %s : %.3f s -> %.3f s (+%.0f %%)"
+                  % (size, phase, before, after, (after / before - 1) * 100))
+        if regressions:
+            sys.exit(1)
+        print("aucune régression par rapport à %s" % args.compare)
@@ -0,0 +1,135 @@
+import re
+
+
+# Table de correspondance (crosswalk) des identifiants des imprimeurs : ISNI, VIAF, BnF et IdRef apparaissent dans
+# la base imprimeurs, les fiches TEI et les mazarinades sous plusieurs formes (isni:..., http://isni.org/isni/...,
+# viaf:..., http://data.bnf.fr/ark:/12148/cb...#foaf:Person, FRBNF..., http://www.idref.fr/.../id...). Toutes ces
+# formes sont ramenées par une seule expression régulière à une forme canonique "schéma:valeur" (isni:..., viaf:...,
+# bnf:... avec le numéro FRBNF à 8 chiffres, idref:...).
+
+identifier_forms = re.compile(r"""^(?:
+    (?:isni:|https?://(?:www\.)?isni\.org/isni/)(?P<isni>\d{15}[\dX])
+  | (?:viaf:|https?://(?:www\.)?viaf\.org/viaf/)(?P<viaf>\d+)
+  | (?:bnf:|IL:(?:FRBNF)?|FRBNF|https?://(?:data|catalogue)\.bnf\.fr/ark:/12148/cb)(?P<bnf>\d{8})[\dA-Z]?(?:\#?foaf:Person)?
+  | (?:idref:|https?://(?:www\.)?idref\.fr/)(?P<idref>\d{8}[\dX])(?:/id)?
+)/?$""", re.VERBOSE | re.IGNORECASE)
+
+# formes abrégées isni:... et viaf:... complétées par l'adresse de l'identifiant (pour les requêtes SPARQL)
+prefixes = re.compile(r"^(isni|viaf):")
+bases = {"isni": "http://isni.org/isni/", "viaf": "http://viaf.org/viaf/"}
+
+# alphabet des caractères de contrôle des ARK de la BnF (algorithme NOID)
+noid_digits = "0123456789bcdfghjkmnpqrstvwxz"
+
+
+def expand(identifier):
+    """
+    Supprime les espaces d'un identifiant et complète les formes abrégées isni:... et viaf:... avec l'adresse de
+    l'identifiant ; les autres formes sont gardées telles quelles.
+    Retourne l'identifiant.
+    """
+
+    return prefixes.sub(lambda match: bases[match.group(1)], identifier.replace(" ", ""))
+
+
+def canonical(identifier, scheme=None):
+    """
+    Ramène un identifiant, sous l'une de ses formes connues, à sa forme canonique "schéma:valeur". Si scheme est
+    donné, un identifiant sans préfixe (par exemple la colonne Identifiant_BnF) est lu comme un identifiant de ce
+    schéma.
+    Retourne la forme canonique, ou None si l'identifiant n'est pas reconnu.
+    """
+
+    if not identifier:
+        return None
+    identifier = identifier.replace(" ", "")
+    match = identifier_forms.match(identifier)
+    if match is None and scheme:
+        match = identifier_forms.match(scheme + ":" + identifier)
+    if match is None:
+        return None
+    scheme = match.lastgroup
+    return scheme + ":" + match.group(scheme).upper()
+
+
+def split_identifiers(identifiers):
+    """
+    Découpe la colonne Liste_Identifiants de la base imprimeurs (identifiants séparés par des virgules). Les valeurs
+    vides sont gardées, pour que la fiche TEI les signale par un <bibl @source="none">.
+    Retourne la liste des identifiants.
+    """
+
+    return identifiers.split(",")
+
+
+def ark_check(name):
+    """
+    Calcule le caractère de contrôle (algorithme NOID) d'un nom d'ARK de la BnF (cb suivi du numéro FRBNF).
+    """
+
+    total = sum(position * max(noid_digits.find(char), 0) for position, char in enumerate(name, 1))
+    return noid_digits[total % len(noid_digits)]
+
+
+def to_uri(key):
+    """
+    Retourne l'adresse correspondant à un identifiant canonique.
+    """
+
+    scheme, value = key.split(":", 1)
+    if scheme == "bnf":
+        name = "cb" + value
+        return "http://data.bnf.fr/ark:/12148/%s%s#foaf:Person" % (name, ark_check(name))
+    if scheme == "idref":
+        return "http://www.idref.fr/%s/id" % value
+    return bases[scheme] + value
+
+
+class Crosswalk:
+    """
+    Index bidirectionnel entre les identifiants et les imprimeurs :
+    - printers : identifiant canonique -> clé de l'imprimeur
+    - identifiers : clé de l'imprimeur -> identifiants canoniques, dans l'ordre où ils ont été ajoutés
+    Un identifiant, sous n'importe laquelle de ses formes, est ainsi relié en temps constant à son imprimeur, et
+    inversement.
+    """
+
+    def __init__(self):
+        self.printers = {}
+        self.identifiers = {}
+
+    def add(self, key, identifiers, scheme=None):
+        """
+        Associe des identifiants (sous n'importe quelle forme) à la clé d'un imprimeur ; les identifiants non
+        reconnus sont ignorés.
+        """
+
+        known = self.identifiers.setdefault(key, [])
+        for identifier in identifiers:
+            identifier = canonical(identifier, scheme)
+            if identifier is None:
+                continue
+            self.printers.setdefault(identifier, key)
+            if identifier not in known:
+                known.append(identifier)
+
+    def resolve(self, identifier):
+        """
+        Retourne la clé de l'imprimeur correspondant à un identifiant, ou None.
+        """
+
+        return self.printers.get(canonical(identifier))
+
+    def schemes(self, key):
+        """
+        Retourne les identifiants d'un imprimeur regroupés par schéma (isni, viaf, bnf, idref).
+        """
+
+        schemes = {}
+        for identifier in self.identifiers.get(key, ()):
+            scheme, value = identifier.split(":", 1)
+            schemes.setdefault(scheme, []).append(value)
+        return schemes
+
+    def __len__(self):
+        return len(self.identifiers)
@@ -0,0 +1,119 @@
+import re
+import unicodedata
+from collections import Counter
+
+
+# Index des formes du nom des imprimeurs (forme normale et autres formes), pour relier aux imprimeurs les
+# <publisher> des mazarinades qui n'ont pas de @ref. Les noms sont normalisés (sans accents, casse ni ponctuation,
+# mots triés) : une table de hachage donne les correspondances exactes, et un index inversé des trigrammes de
+# caractères donne les candidats proches, sans comparer chaque nom à tous les autres.
+
+qualifiers = re.compile(r"\([^)]*\)")
+punctuation = re.compile(r"[^\w]+")
+# mots des adresses typographiques qui ne font pas partie du nom ("chez Gervais Alliot", "par Pierre Anguerrant")
+imprint_words = {"chez", "par"}
+
+
+def fold_name(name):
+    """
+    Normalise une forme du nom : suppression des précisions entre parenthèses ("(imprimeur-libraire)"), des
+    accents, de la casse, de la ponctuation et des mots "chez" et "par", puis tri des mots, pour que
+    "Alliot, Gervais" et "chez Gervais Aliot" ne diffèrent que par l'orthographe.
+    Retourne la forme normalisée (chaîne vide si le nom ne contient aucun mot).
+    """
+
+    name = qualifiers.sub(" ", name)
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char)).casefold()
+    return " ".join(sorted(word for word in punctuation.sub(" ", name).split() if word not in imprint_words))
+
+
+def trigrams(folded):
+    """
+    Retourne l'ensemble des trigrammes de caractères d'un nom normalisé (avec une espace au début et à la fin, pour
+    que les noms courts aient aussi des trigrammes).
+    """
+
+    folded = " %s " % folded
+    return {folded[i:i + 3] for i in range(len(folded) - 2)}
+
+
+class NameIndex:
+    """
+    Index des formes du nom : chaque forme normalisée est associée à une clé (identifiant de l'imprimeur).
+    - exact : forme normalisée -> ensemble des clés
+    - postings : trigramme -> liste des formes normalisées qui le contiennent
+    """
+
+    def __init__(self):
+        self.exact = {}
+        self.sizes = {}
+        self.postings = {}
+
+    def add(self, name, key):
+        """
+        Ajoute une forme du nom d'un imprimeur, associée à sa clé.
+        """
+
+        folded = fold_name(name)
+        if not folded:
+            return
+        if folded not in self.exact:
+            grams = trigrams(folded)
+            self.sizes[folded] = len(grams)
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(folded)
+        self.exact.setdefault(folded, set()).add(key)
+
+    def __len__(self):
+        return len(self.exact)
+
+    def candidates(self, name, limit=5):
+        """
+        Cherche les formes du nom les plus proches d'un nom : seules les formes qui partagent au moins un trigramme
+        avec lui sont examinées, et elles sont classées par coefficient de Dice (2 x trigrammes communs / somme des
+        nombres de trigrammes).
+        Retourne la liste des couples (score, forme normalisée) les mieux classés.
+        """
+
+        folded = fold_name(name)
+        if not folded:
+            return []
+        grams = trigrams(folded)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        scores = [(2 * count / (len(grams) + self.sizes[form]), form) for form, count in shared.items()]
+        scores.sort(key=lambda score: (-score[0], score[1]))
+        return scores[:limit]
+
+    def match(self, name, threshold=0.75):
+        """
+        Relie un nom à un imprimeur : d'abord par correspondance exacte de la forme normalisée, sinon par la forme
+        la plus proche si son score atteint threshold. Un nom qui correspond à plusieurs imprimeurs (homonymes, ou
+        formes proches à égalité) n'est pas relié.
+        Retourne la clé de l'imprimeur, ou None.
+        """
+
+        folded = fold_name(name)
+        keys = self.exact.get(folded)
+        if keys is None:
+            best = self.candidates(name, limit=2)
+            if not best or best[0][0] < threshold or (len(best) > 1 and best[1][0] == best[0][0]):
+                return None
+            keys = self.exact[best[0][1]]
+        return next(iter(keys)) if len(keys) == 1 else None
+
+    def link(self, names, threshold=0.75):
+        """
+        Relie en une seule passe une liste de noms (par exemple tous les <publisher> sans @ref du corpus) : chaque
+        nom différent n'est cherché qu'une fois.
+        Retourne un dictionnaire nom -> clé de l'imprimeur, pour les noms qui ont pu être reliés.
+        """
+
+        links = {}
+        for name in set(names):
+            key = self.match(name, threshold)
+            if key is not None:
+                links[name] = key
+        return links
@@ -0,0 +1,294 @@
+import csv
+import glob
+import re
+from collections import namedtuple
+from lxml import etree
+
+from identifiers import Crosswalk, expand, split_identifiers
+from name_index import NameIndex
+from printers_to_tei import get_xmlid
+
+
+# Base des imprimeurs en mémoire : charge les fiches TEI des imprimeurs (ou le TSV de la base imprimeurs) une seule
+# fois, et permet ensuite de retrouver un imprimeur par son @xml:id, l'un de ses identifiants (ISNI, VIAF, BnF,
+# IdRef), son nom ou sa ville sans relire de XML.
+
+ns = {'tei': 'http://www.tei-c.org/ns/1.0'}
+
+# Expressions XPath précompilées, évaluées sur chaque fiche d'imprimeur
+printer_id = etree.XPath("/tei:teiCorpus/@xml:id", namespaces=ns)
+printer_title = etree.XPath("/tei:teiCorpus/tei:teiHeader//tei:titleStmt/tei:title[@type='standard']", namespaces=ns)
+printer_sources = etree.XPath("/tei:teiCorpus/tei:teiHeader//tei:sourceDesc/tei:listBibl/tei:bibl/@source",
+                              namespaces=ns)
+printer_person = etree.XPath("/tei:teiCorpus/tei:teiHeader//tei:particDesc/tei:listPerson/tei:person",
+                             namespaces=ns)
+printer_mazarinades = etree.XPath("/tei:teiCorpus/tei:TEI[@corresp != 'none']", namespaces=ns)
+
+spaces = re.compile(r"\s+")
+
+# Mazarinade d'une fiche d'imprimeur (élément <TEI>) :
+# - corresp : le fichier de la mazarinade (@corresp)
+# - title : le titre
+# - authors : les auteurs, sous forme de couples (@ref ou None, nom ou None)
+# - pages : le nombre de pages (None s'il n'est pas connu)
+# - decoration : le nombre de marques d'imprimeur (0, 1 ou 2 et plus)
+# - repository : le lieu et le nom de l'institution de conservation
+# - idno : le lien vers la numérisation (None s'il n'est pas connu)
+MazarinadeEntry = namedtuple("MazarinadeEntry", ["corresp", "title", "authors", "pages", "decoration", "repository",
+                                                 "idno"])
+
+
+def clean_text(text):
+    """
+    Réduit les espaces et retours à la ligne d'un texte des fiches (indentation des fichiers).
+    Retourne None si le texte est vide.
+    """
+
+    if text is None:
+        return None
+    return spaces.sub(" ", text).strip() or None
+
+
+class Printer:
+    """
+    Fiche d'un imprimeur. Les attributs sont déclarés dans __slots__ pour que chaque fiche reste compacte en
+    mémoire :
+    - xmlid : le @xml:id de la fiche (IL_...)
+    - surname, forename : le nom et le prénom
+    - name : la forme normale du nom ("Nom, Prénom")
+    - alternative_names : les autres formes du nom
+    - sex : le genre
+    - birth, death : les dates de naissance et de mort, si elles sont connues
+    - city, street, sign : la ville, la rue et l'enseigne de l'adresse
+    - identifiers : les identifiants (adresses ISNI, VIAF, BnF, IdRef)
+    - mazarinades : les mazarinades imprimées (tuples MazarinadeEntry)
+    """
+
+    __slots__ = ("xmlid", "surname", "forename", "name", "alternative_names", "sex", "birth", "death", "city",
+                 "street", "sign", "identifiers", "mazarinades")
+
+    def __init__(self, xmlid, surname=None, forename=None, name=None, alternative_names=(), sex=None, birth=None,
+                 death=None, city=None, street=None, sign=None, identifiers=(), mazarinades=()):
+        self.xmlid = xmlid
+        self.surname = surname
+        self.forename = forename
+        self.name = name
+        self.alternative_names = tuple(alternative_names)
+        self.sex = sex
+        self.birth = birth
+        self.death = death
+        self.city = city
+        self.street = street
+        self.sign = sign
+        self.identifiers = tuple(identifiers)
+        self.mazarinades = tuple(mazarinades)
+
+    def __repr__(self):
+        return "Printer(%r, %r)" % (self.xmlid, self.name)
+
+
+def read_mazarinade_entry(tei):
+    """
+    Lit un élément <TEI> (mazarinade) d'une fiche d'imprimeur.
+    Retourne un tuple nommé MazarinadeEntry.
+    """
+
+    pages = tei.find("tei:teiHeader/tei:fileDesc/tei:extent/tei:measure[@unit='pages']", namespaces=ns)
+    pages = pages.get("quantity", "") if pages is not None else ""
+    decoration = tei.find("tei:teiHeader/tei:fileDesc/tei:extent/tei:measure[@unit='decoration']", namespaces=ns)
+    decoration = decoration.get("quantity", "") if decoration is not None else ""
+    idno = tei.find("tei:teiHeader/tei:fileDesc/tei:sourceDesc/tei:msDesc/tei:msIdentifier/tei:idno", namespaces=ns)
+    idno = idno.get("source") if idno is not None else None
+    # les auteurs sans identifiant ont le @ref par défaut isni:0000
+    authors = tuple((None if author.get("ref") == "isni:0000" else author.get("ref"),
+                     clean_text("".join(author.itertext())))
+                    for author in tei.iterfind("tei:teiHeader/tei:fileDesc/tei:titleStmt/tei:author", namespaces=ns))
+
+    return MazarinadeEntry(
+        corresp=tei.get("corresp"),
+        title=clean_text(tei.findtext("tei:teiHeader/tei:fileDesc/tei:titleStmt/tei:title", namespaces=ns)),
+        authors=authors,
+        pages=int(pages) if pages.isdigit() and pages != "0" else None,
+        decoration=int(decoration) if decoration.isdigit() else 0,
+        repository=clean_text(tei.findtext("tei:teiHeader/tei:fileDesc/tei:sourceDesc/tei:msDesc/tei:msIdentifier/"
+                                           "tei:repository", namespaces=ns)),
+        idno=idno if idno and idno != "None" else None,
+    )
+
+
+def read_printer(file):
+    """
+    Lit la fiche TEI d'un imprimeur.
+    Retourne un objet Printer.
+    """
+
+    doc = etree.parse(file)
+    title = printer_title(doc)
+    person = printer_person(doc)
+    person = person[0] if person else None
+
+    def person_text(path):
+        return clean_text(person.findtext(path, namespaces=ns)) if person is not None else None
+
+    def person_date(path):
+        # les dates inconnues sont renseignées avec une valeur par défaut et @cert="low"
+        date = person.find(path, namespaces=ns) if person is not None else None
+        if date is None or date.get("cert") == "low":
+            return None
+        return date.get("when")
+
+    alternative_names = []
+    if person is not None:
+        for persname in person.iterfind("tei:persName[@type='alternative']", namespaces=ns):
+            alternative_name = clean_text(persname.text)
+            if alternative_name:
+                alternative_names.append(alternative_name)
+
+    return Printer(
+        xmlid="".join(printer_id(doc)),
+        surname=clean_text(title[0].findtext("tei:surname", namespaces=ns)) if title else None,
+        forename=clean_text(title[0].findtext("tei:forename", namespaces=ns)) if title else None,
+        name=person_text("tei:persName[@type='standard']"),
+        alternative_names=alternative_names,
+        sex=person_text("tei:sex"),
+        birth=person_date("tei:birth"),
+        death=person_date("tei:death"),
+        city=person_text("tei:residence/tei:address/tei:settlement"),
+        street=person_text("tei:residence/tei:address/tei:street"),
+        sign=person_text("tei:residence/tei:address/tei:objectName"),
+        identifiers=[source for source in printer_sources(doc) if source != "none"],
+        mazarinades=[read_mazarinade_entry(tei) for tei in printer_mazarinades(doc)],
+    )
+
+
+def read_tsv_printer(row):
+    """
+    Lit la ligne d'un imprimeur dans le TSV de la base imprimeurs (mêmes colonnes que pour printers_to_tei.py).
+    Retourne un objet Printer (sans mazarinades, qui ne sont pas dans le TSV).
+    """
+
+    street = " ; ".join(part for part in (row[7], row[8]) if part)
+    identifiers = split_identifiers(row[15]) + [row[13], row[14], row[12]]
+    identifiers = list(dict.fromkeys(expand(identifier) for identifier in identifiers if identifier))
+
+    return Printer(
+        xmlid=get_xmlid(row),
+        surname=row[0] or None,
+        forename=row[1] or None,
+        name=row[0] + ", " + row[1],
+        alternative_names=[re.sub("^'|'$", "", name) for name in row[2].split("',") if name],
+        sex=row[5] or None,
+        birth=row[3] or None,
+        death=row[4] or None,
+        city=row[6] or None,
+        street=street or None,
+        sign=row[9] or None,
+        identifiers=identifiers,
+    )
+
+
+class PrinterDatabase:
+    """
+    Ensemble des fiches d'imprimeurs, avec des index (dictionnaires) par @xml:id, par identifiant (Crosswalk), par
+    nom, par ville et par mazarinade : chaque recherche se fait en temps constant.
+    """
+
+    def __init__(self, printers=()):
+        self.printers = []
+        self.by_xmlid = {}
+        self.crosswalk = Crosswalk()
+        self.by_surname = {}
+        self.by_city = {}
+        self.by_mazarinade = {}
+        for printer in printers:
+            self.add(printer)
+
+    @classmethod
+    def from_tei(cls, directory="../TEI/printers_Antonomaz"):
+        """
+        Charge toutes les fiches TEI (IL_*.xml) d'un dossier.
+        """
+
+        return cls(read_printer(file) for file in sorted(glob.glob(directory + "/IL_*.xml")))
+
+    @classmethod
+    def from_tsv(cls, path="../CSV/Antonomaz/base_imprimeurs_joined.tsv"):
+        """
+        Charge la base imprimeurs à partir du TSV.
+        """
+
+        with open(path) as tsvfile:
+            tsvreader = csv.reader(tsvfile, delimiter="\t")
+            next(tsvreader, None)  # cette ligne sert à ne pas lire les headers du fichier
+            return cls(read_tsv_printer(row) for row in tsvreader)
+
+    def add(self, printer):
+        """
+        Ajoute une fiche et l'enregistre dans les index.
+        """
+
+        self.printers.append(printer)
+        self.by_xmlid[printer.xmlid] = printer
+        self.crosswalk.add(printer.xmlid, printer.identifiers)
+        if printer.surname:
+            self.by_surname.setdefault(printer.surname.casefold(), []).append(printer)
+        if printer.city:
+            self.by_city.setdefault(printer.city.casefold(), []).append(printer)
+        for maz in printer.mazarinades:
+            self.by_mazarinade.setdefault(maz.corresp, []).append(printer)
+
+    def name_index(self):
+        """
+        Construit l'index des formes du nom (forme normale et autres formes) des imprimeurs, associées à leur
+        @xml:id, pour relier des noms d'imprimeurs sans identifiant (par exemple avec NameIndex.link).
+        Retourne un NameIndex.
+        """
+
+        names = NameIndex()
+        for printer in self.printers:
+            for name in (printer.name,) + printer.alternative_names:
+                if name:
+                    names.add(name, printer.xmlid)
+        return names
+
+    def __len__(self):
+        return len(self.printers)
+
+    def __iter__(self):
+        return iter(self.printers)
+
+    def get(self, xmlid):
+        """
+        Retourne l'imprimeur dont le @xml:id est donné, ou None.
+        """
+
+        return self.by_xmlid.get(xmlid)
+
+    def find_identifier(self, identifier):
+        """
+        Retourne l'imprimeur correspondant à un identifiant ISNI, VIAF, BnF ou IdRef, sous n'importe laquelle de ses
+        formes (isni:..., adresse complète, FRBNF...), ou None.
+        """
+
+        return self.by_xmlid.get(self.crosswalk.resolve(identifier))
+
+    def find_surname(self, surname):
+        """
+        Retourne la liste des imprimeurs portant ce nom (sans tenir compte de la casse).
+        """
+
+        return self.by_surname.get(surname.casefold(), [])
+
+    def find_city(self, city):
+        """
+        Retourne la liste des imprimeurs établis dans cette ville (sans tenir compte de la casse).
+        """
+
+        return self.by_city.get(city.casefold(), [])
+
+    def find_mazarinade(self, corresp):
+        """
+        Retourne la liste des imprimeurs d'une mazarinade (nom de son fichier, valeur du @corresp).
+        """
+
+        return self.by_mazarinade.get(corresp, [])
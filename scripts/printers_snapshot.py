@@ -0,0 +1,332 @@
+import argparse
+import mmap
+import os
+import struct
+
+from identifiers import canonical
+from printers_database import MazarinadeEntry, Printer, PrinterDatabase
+
+
+# Instantané binaire de la base des imprimeurs et de leurs mazarinades, lu avec mmap : à l'ouverture, rien n'est
+# parsé ni chargé, les enregistrements sont lus directement dans le fichier au moment des recherches, et plusieurs
+# processus qui ouvrent le même instantané partagent les mêmes pages en mémoire.
+#
+# Format du fichier (entiers little-endian) :
+# - en-tête : signature, version, puis pour chaque section son début (en octets) et son nombre d'éléments
+# - strings : table des chaînes (UTF-8), référencées ailleurs par un couple (début, longueur)
+# - printers : enregistrements de taille fixe des imprimeurs
+# - names, identifiers : références des autres formes du nom et des identifiants (adresses) des imprimeurs
+# - mazarinades : enregistrements de taille fixe des mazarinades
+# - authors : couples de références (@ref, nom) des auteurs des mazarinades
+# - printer_mazarinades, mazarinade_printers : numéros des mazarinades de chaque imprimeur, et inversement
+# - xmlid_index, identifier_index, mazarinade_index : index triés (par @xml:id, par identifiant canonique, par
+#   @corresp) dans lesquels on cherche par dichotomie
+
+magic = b"IMPR"
+version = 1
+
+sections = ["strings", "printers", "names", "identifiers", "mazarinades", "authors", "printer_mazarinades",
+            "mazarinade_printers", "xmlid_index", "identifier_index", "mazarinade_index"]
+header = struct.Struct("<4sI" + "QI" * len(sections))
+
+# référence d'une chaîne : début dans la table et longueur (absent : début 0xFFFFFFFF)
+string_ref = struct.Struct("<II")
+none_ref = (0xFFFFFFFF, 0)
+# imprimeur : 10 chaînes (xmlid, surname, forename, name, sex, birth, death, city, street, sign), puis début et
+# nombre de ses autres formes du nom, de ses identifiants et de ses mazarinades
+printer_record = struct.Struct("<" + "II" * 10 + "II" * 3)
+# mazarinade : 4 chaînes (corresp, title, repository, idno), pages (-1 si inconnu), decoration, puis début et
+# nombre de ses auteurs et de ses imprimeurs
+mazarinade_record = struct.Struct("<" + "II" * 4 + "ii" + "II" * 2)
+author_record = struct.Struct("<" + "II" * 2)
+number = struct.Struct("<I")
+# entrée de l'index des identifiants : identifiant canonique et numéro de l'imprimeur
+identifier_entry = struct.Struct("<III")
+
+item_sizes = {"strings": 1, "printers": printer_record.size, "names": string_ref.size,
+              "identifiers": string_ref.size, "mazarinades": mazarinade_record.size, "authors": author_record.size,
+              "printer_mazarinades": number.size, "mazarinade_printers": number.size, "xmlid_index": number.size,
+              "identifier_index": identifier_entry.size, "mazarinade_index": number.size}
+
+
+class StringTable:
+    """
+    Table des chaînes de l'instantané : chaque chaîne n'y est écrite qu'une fois.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.refs = {}
+
+    def ref(self, text):
+        """
+        Retourne la référence (début, longueur) d'une chaîne, ajoutée à la table si besoin.
+        """
+
+        if text is None:
+            return none_ref
+        if text not in self.refs:
+            encoded = text.encode("utf-8")
+            self.refs[text] = (len(self.data), len(encoded))
+            self.data += encoded
+        return self.refs[text]
+
+
+def write_snapshot(database, path="printers.snapshot"):
+    """
+    Écrit l'instantané binaire d'une base d'imprimeurs (PrinterDatabase chargée à partir des fiches TEI). Le fichier
+    est d'abord écrit sous un nom temporaire, puis remplace l'ancien une fois complet.
+    Retourne le nombre d'imprimeurs et de mazarinades.
+    """
+
+    strings = StringTable()
+    printers = list(database)
+    data = {name: bytearray() for name in sections if name != "strings"}
+
+    # mazarinades, numérotées dans l'ordre de leur première apparition
+    maz_numbers = {}
+    maz_entries = []
+    maz_printers = []
+    for printer_number, printer in enumerate(printers):
+        for maz in printer.mazarinades:
+            if maz.corresp not in maz_numbers:
+                maz_numbers[maz.corresp] = len(maz_entries)
+                maz_entries.append(maz)
+                maz_printers.append([])
+            maz_printers[maz_numbers[maz.corresp]].append(printer_number)
+
+    identifier_keys = []
+    for printer_number, printer in enumerate(printers):
+        fields = [printer.xmlid, printer.surname, printer.forename, printer.name, printer.sex, printer.birth,
+                  printer.death, printer.city, printer.street, printer.sign]
+        counts = []
+        for section, values in (("names", printer.alternative_names), ("identifiers", printer.identifiers)):
+            counts += [len(data[section]) // string_ref.size, len(values)]
+            for value in values:
+                data[section] += string_ref.pack(*strings.ref(value))
+        counts += [len(data["printer_mazarinades"]) // number.size, len(printer.mazarinades)]
+        for maz in printer.mazarinades:
+            data["printer_mazarinades"] += number.pack(maz_numbers[maz.corresp])
+        refs = [value for field in fields for value in strings.ref(field)]
+        data["printers"] += printer_record.pack(*refs, *counts)
+
+        for identifier in printer.identifiers:
+            key = canonical(identifier)
+            if key:
+                identifier_keys.append((key.encode("utf-8"), strings.ref(key)[0], printer_number))
+
+    for maz, maz_printer_numbers in zip(maz_entries, maz_printers):
+        fields = [maz.corresp, maz.title, maz.repository, maz.idno]
+        refs = [value for field in fields for value in strings.ref(field)]
+        counts = [len(data["authors"]) // author_record.size, len(maz.authors),
+                  len(data["mazarinade_printers"]) // number.size, len(maz_printer_numbers)]
+        for author_ref, author_name in maz.authors:
+            data["authors"] += author_record.pack(*strings.ref(author_ref), *strings.ref(author_name))
+        for printer_number in maz_printer_numbers:
+            data["mazarinade_printers"] += number.pack(printer_number)
+        pages = maz.pages if maz.pages is not None else -1
+        data["mazarinades"] += mazarinade_record.pack(*refs, pages, maz.decoration, *counts)
+
+    # index triés selon l'ordre des chaînes encodées en UTF-8 (celui de la recherche par dichotomie)
+    for printer_number in sorted(range(len(printers)), key=lambda i: printers[i].xmlid.encode("utf-8")):
+        data["xmlid_index"] += number.pack(printer_number)
+    for key, start, printer_number in sorted(identifier_keys):
+        data["identifier_index"] += identifier_entry.pack(start, len(key), printer_number)
+    for maz_number in sorted(range(len(maz_entries)), key=lambda i: maz_entries[i].corresp.encode("utf-8")):
+        data["mazarinade_index"] += number.pack(maz_number)
+    data["strings"] = strings.data
+
+    # en-tête : position et nombre d'éléments de chaque section, écrites à la suite
+    offsets = []
+    position = header.size
+    for name in sections:
+        offsets += [position, len(data[name]) // item_sizes[name]]
+        position += len(data[name])
+
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as output:
+        output.write(header.pack(magic, version, *offsets))
+        for name in sections:
+            output.write(data[name])
+    os.replace(temporary, path)
+    return len(printers), len(maz_entries)
+
+
+class Snapshot:
+    """
+    Instantané binaire ouvert avec mmap. Les recherches (get, find_identifier, find_mazarinade) se font par
+    dichotomie dans les index, et seuls les enregistrements trouvés sont décodés (en objets Printer et
+    MazarinadeEntry, comme ceux de PrinterDatabase).
+    """
+
+    def __init__(self, path="printers.snapshot"):
+        with open(path, "rb") as snapshot:
+            self.map = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        values = header.unpack_from(self.map)
+        if values[0] != magic or values[1] != version:
+            raise ValueError("%s n'est pas un instantané de la base imprimeurs (version %d)" % (path, version))
+        self.sections = {name: (values[2 + 2 * i], values[3 + 2 * i]) for i, name in enumerate(sections)}
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.sections["printers"][1]
+
+    def __iter__(self):
+        return (self.printer(printer_number) for printer_number in range(len(self)))
+
+    def string(self, start, length):
+        """
+        Retourne la chaîne de la table des chaînes référencée par (start, length), ou None.
+        """
+
+        if start == none_ref[0]:
+            return None
+        offset = self.sections["strings"][0] + start
+        return self.map[offset:offset + length].decode("utf-8")
+
+    def item(self, section, record, index):
+        """
+        Décode l'élément index d'une section de taille fixe.
+        """
+
+        return record.unpack_from(self.map, self.sections[section][0] + index * record.size)
+
+    def strings(self, section, start, count):
+        """
+        Retourne les chaînes référencées par les éléments start à start + count d'une section de références.
+        """
+
+        return tuple(self.string(*self.item(section, string_ref, index)) for index in range(start, start + count))
+
+    def numbers(self, section, start, count):
+        """
+        Retourne les numéros start à start + count d'une section de numéros.
+        """
+
+        return [self.item(section, number, index)[0] for index in range(start, start + count)]
+
+    def search(self, section, record, key, string_of):
+        """
+        Cherche par dichotomie une chaîne dans un index trié : string_of donne, pour une entrée de l'index, la
+        référence (début, longueur) de la chaîne à comparer.
+        Retourne la liste des entrées de l'index égales à key.
+        """
+
+        key = key.encode("utf-8")
+        strings_start = self.sections["strings"][0]
+
+        def entry_key(index):
+            entry = self.item(section, record, index)
+            start, length = string_of(entry)
+            return self.map[strings_start + start:strings_start + start + length], entry
+
+        low, high = 0, self.sections[section][1]
+        while low < high:
+            middle = (low + high) // 2
+            if entry_key(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        while low < self.sections[section][1]:
+            value, entry = entry_key(low)
+            if value != key:
+                break
+            found.append(entry)
+            low += 1
+        return found
+
+    def printer_ref(self, printer_number):
+        """
+        Retourne la référence du @xml:id de l'imprimeur numéro printer_number.
+        """
+
+        return self.item("printers", printer_record, printer_number)[:2]
+
+    def maz_ref(self, maz_number):
+        """
+        Retourne la référence du @corresp de la mazarinade numéro maz_number.
+        """
+
+        return self.item("mazarinades", mazarinade_record, maz_number)[:2]
+
+    def printer(self, printer_number):
+        """
+        Retourne l'imprimeur numéro printer_number (objet Printer).
+        """
+
+        values = self.item("printers", printer_record, printer_number)
+        xmlid, surname, forename, name, sex, birth, death, city, street, sign = \
+            [self.string(values[i], values[i + 1]) for i in range(0, 20, 2)]
+        names_start, names_count, ids_start, ids_count, maz_start, maz_count = values[20:]
+        return Printer(xmlid, surname=surname, forename=forename, name=name, sex=sex, birth=birth, death=death,
+                       city=city, street=street, sign=sign,
+                       alternative_names=self.strings("names", names_start, names_count),
+                       identifiers=self.strings("identifiers", ids_start, ids_count),
+                       mazarinades=[self.mazarinade(maz_number) for maz_number in
+                                    self.numbers("printer_mazarinades", maz_start, maz_count)])
+
+    def mazarinade(self, maz_number):
+        """
+        Retourne la mazarinade numéro maz_number (tuple nommé MazarinadeEntry).
+        """
+
+        values = self.item("mazarinades", mazarinade_record, maz_number)
+        corresp, title, repository, idno = [self.string(values[i], values[i + 1]) for i in range(0, 8, 2)]
+        pages, decoration, authors_start, authors_count = values[8:12]
+        authors = []
+        for index in range(authors_start, authors_start + authors_count):
+            author = self.item("authors", author_record, index)
+            authors.append((self.string(*author[:2]), self.string(*author[2:])))
+        return MazarinadeEntry(corresp, title, tuple(authors), pages if pages >= 0 else None, decoration,
+                               repository, idno)
+
+    def get(self, xmlid):
+        """
+        Retourne l'imprimeur dont le @xml:id est donné, ou None.
+        """
+
+        found = self.search("xmlid_index", number, xmlid, lambda entry: self.printer_ref(entry[0]))
+        return self.printer(found[0][0]) if found else None
+
+    def find_identifier(self, identifier):
+        """
+        Retourne l'imprimeur correspondant à un identifiant, sous n'importe laquelle de ses formes, ou None.
+        """
+
+        key = canonical(identifier)
+        found = self.search("identifier_index", identifier_entry, key, lambda entry: entry[:2]) if key else []
+        return self.printer(found[0][2]) if found else None
+
+    def find_mazarinade(self, corresp):
+        """
+        Retourne la liste des imprimeurs d'une mazarinade (valeur du @corresp).
+        """
+
+        found = self.search("mazarinade_index", number, corresp, lambda entry: self.maz_ref(entry[0]))
+        if not found:
+            return []
+        # fin de l'enregistrement : début et nombre des auteurs, puis début et nombre des imprimeurs
+        printers_start, printers_count = self.item("mazarinades", mazarinade_record, found[0][0])[12:14]
+        return [self.printer(printer_number) for printer_number in
+                self.numbers("mazarinade_printers", printers_start, printers_count)]
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Instantané binaire des fiches des imprimeurs")
+    argparser.add_argument("--tei", default="../TEI/printers_Antonomaz",
+                           help="dossier des fiches TEI des imprimeurs (IL_*.xml)")
+    argparser.add_argument("-o", "--output", default="printers.snapshot",
+                           help="fichier de l'instantané (printers.snapshot par défaut)")
+    args = argparser.parse_args()
+
+    counts = write_snapshot(PrinterDatabase.from_tei(args.tei), args.output)
+    print("%d imprimeurs, %d mazarinades" % counts)
@@ -0,0 +1,232 @@
+import argparse
+import csv
+import json
+
+import numpy as np
+
+from printers_database import PrinterDatabase
+
+
+# Statistiques de production des imprimeurs : les mazarinades de toutes les fiches sont chargées une seule fois
+# dans des colonnes NumPy (une ligne par couple imprimeur-mazarinade), et les agrégats par imprimeur (nombre de
+# mazarinades, pages, marques d'imprimeur, institutions de conservation), les percentiles et les classements sont
+# calculés par des opérations vectorisées, sans boucle Python sur les mazarinades.
+
+
+class ProductionColumns:
+    """
+    Colonnes des mazarinades des imprimeurs :
+    - printers : les @xml:id et noms des imprimeurs, dans l'ordre de la base
+    - printer : numéro de l'imprimeur de chaque ligne
+    - pages : nombre de pages (NaN s'il n'est pas connu)
+    - decoration : nombre de marques d'imprimeur
+    - repository : numéro de l'institution de conservation dans repositories
+    """
+
+    def __init__(self, database):
+        self.printers = [(printer.xmlid, printer.name) for printer in database]
+        printer, pages, decoration, repositories = [], [], [], []
+        for number, entry in enumerate(database):
+            for maz in entry.mazarinades:
+                printer.append(number)
+                pages.append(maz.pages if maz.pages is not None else np.nan)
+                decoration.append(maz.decoration)
+                repositories.append(maz.repository or "")
+        self.printer = np.array(printer, dtype=np.int64)
+        self.pages = np.array(pages, dtype=np.float64)
+        self.decoration = np.array(decoration, dtype=np.int64)
+        self.repositories, self.repository = np.unique(np.array(repositories, dtype=str), return_inverse=True)
+        self.repository = self.repository.reshape(-1)
+
+    def __len__(self):
+        return len(self.printer)
+
+
+def grouped_percentiles(groups, values, count, percentiles=(50,)):
+    """
+    Calcule, pour chaque groupe (numéro de 0 à count - 1), des percentiles des valeurs connues (non NaN), par
+    interpolation linéaire comme numpy.percentile : les valeurs sont triées une seule fois par groupe puis par
+    valeur, et la position de chaque percentile est calculée pour tous les groupes à la fois.
+    Retourne un tableau (nombre de percentiles x count), NaN pour les groupes sans valeur.
+    """
+
+    known = ~np.isnan(values)
+    groups, values = groups[known], values[known]
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    sizes = np.bincount(groups, minlength=count)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+
+    result = np.full((len(percentiles), count), np.nan)
+    has_values = sizes > 0
+    for row, percentile in enumerate(percentiles):
+        position = (sizes[has_values] - 1) * percentile / 100.0
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        start = starts[has_values]
+        low_values, high_values = values[start + lower], values[start + upper]
+        result[row, has_values] = low_values + (high_values - low_values) * (position - lower)
+    return result
+
+
+def printer_statistics(columns):
+    """
+    Calcule les agrégats par imprimeur.
+    Retourne un dictionnaire de tableaux NumPy, indexés par numéro d'imprimeur :
+    - mazarinades : nombre de mazarinades
+    - pages_known : nombre de mazarinades dont on connaît le nombre de pages
+    - pages_total, pages_mean, pages_median : total, moyenne et médiane du nombre de pages
+    - decorations : nombre total de marques d'imprimeur
+    - decorated : nombre de mazarinades avec au moins une marque d'imprimeur
+    - top_repository : numéro de l'institution qui conserve le plus de ses mazarinades (-1 s'il n'en a pas)
+    """
+
+    count = len(columns.printers)
+    known = ~np.isnan(columns.pages)
+    mazarinades = np.bincount(columns.printer, minlength=count)
+    pages_known = np.bincount(columns.printer, weights=known, minlength=count).astype(np.int64)
+    pages_total = np.bincount(columns.printer, weights=np.where(known, columns.pages, 0), minlength=count)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pages_mean = pages_total / pages_known
+
+    # répartition des mazarinades de chaque imprimeur par institution de conservation
+    # (aucune institution si aucun imprimeur n'a de mazarinade)
+    distribution = repository_distribution(columns)
+    if distribution.shape[1] == 0:
+        top_repository = np.full(count, -1, dtype=np.int64)
+    else:
+        top_repository = np.where(mazarinades > 0, distribution.argmax(axis=1), -1)
+
+    return {
+        "mazarinades": mazarinades,
+        "pages_known": pages_known,
+        "pages_total": pages_total.astype(np.int64),
+        "pages_mean": pages_mean,
+        "pages_median": grouped_percentiles(columns.printer, columns.pages, count)[0],
+        "decorations": np.bincount(columns.printer, weights=columns.decoration, minlength=count).astype(np.int64),
+        "decorated": np.bincount(columns.printer, weights=columns.decoration > 0, minlength=count).astype(np.int64),
+        "top_repository": top_repository,
+    }
+
+
+def repository_distribution(columns):
+    """
+    Compte les mazarinades de chaque imprimeur par institution de conservation.
+    Retourne une matrice (nombre d'imprimeurs x nombre d'institutions).
+    """
+
+    count, width = len(columns.printers), len(columns.repositories)
+    cells = np.bincount(columns.printer * width + columns.repository, minlength=count * width)
+    return cells.reshape(count, width)
+
+
+def top_printers(statistics, key="mazarinades", n=10):
+    """
+    Classe les imprimeurs selon l'un des agrégats de printer_statistics (du plus grand au plus petit ; à égalité,
+    dans l'ordre de la base).
+    Retourne les numéros des n premiers imprimeurs.
+    """
+
+    values = np.nan_to_num(statistics[key].astype(np.float64), nan=-np.inf)
+    return np.argsort(-values, kind="stable")[:n]
+
+
+def corpus_summary(columns, percentiles=(10, 25, 50, 75, 90)):
+    """
+    Calcule les statistiques de tout le corpus (chaque mazarinade n'est comptée qu'une fois par imprimeur).
+    Retourne un dictionnaire.
+    """
+
+    pages = columns.pages[~np.isnan(columns.pages)]
+    repositories = np.bincount(columns.repository, minlength=len(columns.repositories))
+    return {
+        "printers": len(columns.printers),
+        "printers_with_mazarinades": int(np.count_nonzero(np.bincount(columns.printer,
+                                                                     minlength=len(columns.printers)))),
+        "links": len(columns),
+        "pages_total": int(pages.sum()),
+        "pages_percentiles": {str(p): float(v) for p, v in
+                              zip(percentiles, np.percentile(pages, percentiles) if len(pages) else
+                                  [float("nan")] * len(percentiles))},
+        "decorations": int(columns.decoration.sum()),
+        "repositories": {repository or "inconnu": int(total) for repository, total in
+                         sorted(zip(columns.repositories, repositories), key=lambda item: -item[1])},
+    }
+
+
+def printer_rows(columns, statistics):
+    """
+    Prépare une ligne par imprimeur (dictionnaire) pour l'export en CSV ou en JSON.
+    Retourne la liste des lignes, dans l'ordre de la base.
+    """
+
+    rows = []
+    for number, (xmlid, name) in enumerate(columns.printers):
+        top = statistics["top_repository"][number]
+        rows.append({
+            "xmlid": xmlid,
+            "name": name,
+            "mazarinades": int(statistics["mazarinades"][number]),
+            "pages_total": int(statistics["pages_total"][number]),
+            "pages_mean": round(float(statistics["pages_mean"][number]), 2),
+            "pages_median": float(statistics["pages_median"][number]),
+            "decorations": int(statistics["decorations"][number]),
+            "decorated": int(statistics["decorated"][number]),
+            "top_repository": str(columns.repositories[top]) if top >= 0 else None,
+        })
+    return rows
+
+
+def export_csv(rows, path):
+    """
+    Écrit les statistiques par imprimeur dans un fichier CSV (NaN pour les valeurs inconnues).
+    """
+
+    with open(path, "w", newline="") as csvfile:
+        csvwriter = csv.DictWriter(csvfile, fieldnames=list(rows[0]) if rows else [])
+        csvwriter.writeheader()
+        csvwriter.writerows(rows)
+
+
+def export_json(rows, summary, top, path):
+    """
+    Écrit les statistiques (corpus, imprimeurs et classements) dans un fichier JSON (null pour les valeurs
+    inconnues).
+    """
+
+    def known(value):
+        return None if isinstance(value, float) and np.isnan(value) else value
+
+    clean_rows = [{key: known(value) for key, value in row.items()} for row in rows]
+    summary = dict(summary, pages_percentiles={key: known(value) for key, value in
+                                               summary["pages_percentiles"].items()})
+    with open(path, "w", encoding="utf-8") as jsonfile:
+        json.dump({"corpus": summary, "top": top, "printers": clean_rows}, jsonfile, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Statistiques de production des imprimeurs")
+    argparser.add_argument("--tei", default="../TEI/printers_Antonomaz",
+                           help="dossier des fiches TEI des imprimeurs (IL_*.xml)")
+    argparser.add_argument("--snapshot", metavar="FICHIER",
+                           help="lit les fiches dans un instantané binaire (printers_snapshot.py) plutôt qu'en TEI")
+    argparser.add_argument("--csv", default="printers_stats.csv", help="statistiques par imprimeur, en CSV")
+    argparser.add_argument("--json", default="printers_stats.json", help="statistiques complètes, en JSON")
+    argparser.add_argument("-n", "--top", type=int, default=10, help="taille des classements (10 par défaut)")
+    args = argparser.parse_args()
+
+    if args.snapshot:
+        from printers_snapshot import Snapshot
+        with Snapshot(args.snapshot) as snapshot:
+            database = list(snapshot)
+    else:
+        database = PrinterDatabase.from_tei(args.tei)
+
+    columns = ProductionColumns(database)
+    statistics = printer_statistics(columns)
+    rows = printer_rows(columns, statistics)
+    top = {key: [rows[number]["xmlid"] for number in top_printers(statistics, key, args.top)]
+           for key in ("mazarinades", "pages_total", "decorations")}
+    export_csv(rows, args.csv)
+    export_json(rows, corpus_summary(columns), top, args.json)
+    print("%d imprimeurs, %d liens imprimeur-mazarinade" % (len(columns.printers), len(columns)))
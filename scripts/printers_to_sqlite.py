@@ -0,0 +1,141 @@
+import argparse
+import os
+import sqlite3
+
+from identifiers import canonical
+from name_index import fold_name
+from printers_database import PrinterDatabase
+from printers_to_tei import cities
+
+
+# Export de la base imprimeurs dans un fichier SQLite normalisé : les imprimeurs du TSV de la base imprimeurs, leurs
+# identifiants, les formes de leur nom, leurs adresses, et les mazarinades des fiches TEI générées par
+# printers_to_tei.py, reliées à leurs imprimeurs. Les tables sont indexées pour les jointures et les recherches
+# courantes (par identifiant, par nom, par ville, par mazarinade).
+
+schema = """
+CREATE TABLE printers (
+    id INTEGER PRIMARY KEY,
+    xmlid TEXT NOT NULL UNIQUE,
+    surname TEXT,
+    forename TEXT,
+    name TEXT,
+    sex TEXT,
+    birth TEXT,
+    death TEXT
+);
+CREATE TABLE identifiers (
+    printer_id INTEGER NOT NULL REFERENCES printers(id),
+    scheme TEXT,
+    value TEXT,
+    uri TEXT NOT NULL
+);
+CREATE TABLE name_variants (
+    printer_id INTEGER NOT NULL REFERENCES printers(id),
+    name TEXT NOT NULL,
+    folded TEXT NOT NULL,
+    standard INTEGER NOT NULL
+);
+CREATE TABLE addresses (
+    printer_id INTEGER NOT NULL REFERENCES printers(id),
+    city TEXT,
+    geonames TEXT,
+    street TEXT,
+    sign TEXT
+);
+CREATE TABLE mazarinades (
+    id INTEGER PRIMARY KEY,
+    corresp TEXT NOT NULL UNIQUE,
+    title TEXT,
+    pages INTEGER,
+    decoration INTEGER NOT NULL,
+    repository TEXT,
+    idno TEXT
+);
+CREATE TABLE links (
+    printer_id INTEGER NOT NULL REFERENCES printers(id),
+    mazarinade_id INTEGER NOT NULL REFERENCES mazarinades(id),
+    PRIMARY KEY (printer_id, mazarinade_id)
+) WITHOUT ROWID;
+CREATE INDEX identifiers_value ON identifiers (scheme, value);
+CREATE INDEX identifiers_printer ON identifiers (printer_id);
+CREATE INDEX name_variants_folded ON name_variants (folded);
+CREATE INDEX name_variants_printer ON name_variants (printer_id);
+CREATE INDEX addresses_city ON addresses (city);
+CREATE INDEX addresses_printer ON addresses (printer_id);
+CREATE INDEX printers_surname ON printers (surname COLLATE NOCASE);
+CREATE INDEX mazarinades_decoration ON mazarinades (decoration);
+CREATE INDEX mazarinades_repository ON mazarinades (repository);
+CREATE INDEX links_mazarinade ON links (mazarinade_id, printer_id);
+"""
+
+
+def export_sqlite(printers, mazarinades, path="printers_database.sqlite"):
+    """
+    Écrit la base SQLite : printers est une base d'imprimeurs (PrinterDatabase, chargée à partir du TSV) et
+    mazarinades une base chargée à partir des fiches TEI, dont on reprend les mazarinades de chaque imprimeur (même
+    @xml:id). Le fichier est d'abord écrit sous un nom temporaire, puis remplace l'ancien une fois complet.
+    Retourne le nombre d'imprimeurs, de mazarinades et de liens exportés.
+    """
+
+    temporary = path + ".tmp"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    connection = sqlite3.connect(temporary)
+    connection.executescript(schema)
+
+    maz_ids = {}
+    links = 0
+    with connection:
+        for printer_id, printer in enumerate(printers, 1):
+            connection.execute("INSERT INTO printers VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               (printer_id, printer.xmlid, printer.surname, printer.forename, printer.name,
+                                printer.sex, printer.birth, printer.death))
+
+            identifiers = []
+            for uri in printer.identifiers:
+                key = canonical(uri)
+                scheme, value = key.split(":", 1) if key else (None, None)
+                identifiers.append((printer_id, scheme, value, uri))
+            connection.executemany("INSERT INTO identifiers VALUES (?, ?, ?, ?)", identifiers)
+
+            variants = [(printer.name, 1)] + [(name, 0) for name in printer.alternative_names]
+            connection.executemany("INSERT INTO name_variants VALUES (?, ?, ?, ?)",
+                                   ((printer_id, name, fold_name(name), standard)
+                                    for name, standard in variants if name))
+
+            if printer.city or printer.street or printer.sign:
+                connection.execute("INSERT INTO addresses VALUES (?, ?, ?, ?, ?)",
+                                   (printer_id, printer.city, cities.get(printer.city), printer.street,
+                                    printer.sign))
+
+            # mazarinades de la fiche TEI de l'imprimeur ; une mazarinade imprimée par plusieurs imprimeurs n'est
+            # enregistrée qu'une fois
+            tei = mazarinades.get(printer.xmlid)
+            for maz in tei.mazarinades if tei is not None else ():
+                if maz.corresp not in maz_ids:
+                    maz_ids[maz.corresp] = len(maz_ids) + 1
+                    connection.execute("INSERT INTO mazarinades VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                       (maz_ids[maz.corresp], maz.corresp, maz.title, maz.pages, maz.decoration,
+                                        maz.repository, maz.idno))
+                links += connection.execute("INSERT OR IGNORE INTO links VALUES (?, ?)",
+                                            (printer_id, maz_ids[maz.corresp])).rowcount
+
+    connection.execute("ANALYZE")
+    connection.close()
+    os.replace(temporary, path)
+    return len(printers), len(maz_ids), links
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Export de la base imprimeurs et des mazarinades en SQLite")
+    argparser.add_argument("--tsv", default="../CSV/Antonomaz/base_imprimeurs_joined.tsv",
+                           help="TSV de la base imprimeurs")
+    argparser.add_argument("--tei", default="../TEI/printers_Antonomaz",
+                           help="dossier des fiches TEI des imprimeurs (IL_*.xml)")
+    argparser.add_argument("-o", "--output", default="printers_database.sqlite",
+                           help="fichier SQLite (printers_database.sqlite par défaut)")
+    args = argparser.parse_args()
+
+    counts = export_sqlite(PrinterDatabase.from_tsv(args.tsv), PrinterDatabase.from_tei(args.tei), args.output)
+    print("%d imprimeurs, %d mazarinades, %d liens" % counts)
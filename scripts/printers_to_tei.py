@@ -1,200 +1,819 @@
+import argparse
 import csv
+import filecmp
 import glob
+import hashlib
+import io
+import json
+import sqlite3
+from collections import namedtuple
+from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
 from lxml import etree
-import xml.etree.ElementTree as ET
 import re
 import os
 
+from identifiers import Crosswalk, split_identifiers
+from name_index import NameIndex
+from profiling import disable_profiler, profiler
+
 
 ns = {'tei': 'http://www.tei-c.org/ns/1.0'}
 
 
-def get_maz_corresp(doc):
-    """
-    Cette fonction va chercher les @xml:id des mazarinades pour chaque imprimeur.
-    Elle sert à enrichir les éléments <TEI> du <teiCorpus> des fiches d'imprimeurs.
-    Retourne un dictionnaire:
-    - en clé (ident) = l'identifiant de l'imprimeur
-    - en valeur (corresp) = la valeur du @xml:id des mazarinades qu'il a imprimées
-    """
-
-    printers = doc.xpath("//tei:teiHeader//tei:sourceDesc/tei:bibl//tei:publisher", namespaces=ns)
-    att_corresp = {}
-    for printer in printers:
-        ident = printer.get("ref")
-        if ident not in att_corresp:
-            att_corresp[ident] = []
-            corresps = doc.xpath("/tei:TEI/@xml:id", namespaces=ns)
-            for corresp in corresps:
-                corresp = re.sub(" ", "", corresp)
-                att_corresp[ident].append(corresp)
-
-    return att_corresp
-
-
-def get_maz_title(doc):
-    """
-    Cette fonction va chercher les titres des mazarinades pour chaque imprimeur.
-    Elle sert à enrichir les éléments <TEI> du <teiCorpus> des fiches d'imprimeurs.
-    Retourne un dictionnaire:
-    - en clé (ident) = l'identifiant de l'imprimeur
-    - en valeur (title) = le texte du titre des mazarinades qu'il a imprimées
-    """
 
-    printers = doc.xpath("//tei:teiHeader//tei:sourceDesc/tei:bibl/tei:publisher", namespaces=ns)
-    all_titles = {}
-    for printer in printers:
-        ident = printer.get("ref")
-        if ident not in all_titles:
-            all_titles[ident] = []
-            titles = doc.xpath("//tei:teiHeader//tei:titleStmt/tei:title[@type='main']/text()", namespaces=ns)
-            for title in titles:
-                title = re.sub("\n", "", title)
-                title = re.sub("\s{2,}", " ", title)
-                all_titles[ident].append(title)
+def counted_xpath(path):
+    """
+    Précompile une expression XPath (espace de noms TEI).
+    Retourne une fonction qui l'évalue, en comptant chaque évaluation dans le compteur xpath_evaluations du
+    profileur.
+    """
+
+    xpath = etree.XPath(path, namespaces=ns)
+
+    def evaluate(node):
+        profiler.count("xpath_evaluations")
+        return xpath(node)
+
+    return evaluate
+
+
+# Expressions XPath précompilées, évaluées une seule fois par mazarinade
+maz_publishers = counted_xpath("//tei:teiHeader//tei:sourceDesc/tei:bibl//tei:publisher")
+maz_id = counted_xpath("/tei:TEI/@xml:id")
+maz_titles = counted_xpath("//tei:teiHeader//tei:titleStmt/tei:title[@type='main']/text()")
+maz_authors = counted_xpath("//tei:teiHeader//tei:sourceDesc/tei:bibl//tei:author")
+maz_pages = counted_xpath("//tei:teiHeader//tei:sourceDesc/tei:bibl/tei:extent/tei:measure/@quantity")
+maz_decos = counted_xpath("count(//tei:text//tei:body/tei:p//tei:figure[@type='decoration'])")
+maz_settlements = counted_xpath("//tei:teiHeader//tei:sourceDesc/tei:msDesc/tei:msIdentifier/tei:settlement/text()")
+maz_institutions = counted_xpath("//tei:teiHeader//tei:sourceDesc/tei:msDesc/tei:msIdentifier/tei:institution/text()")
+maz_idnos = counted_xpath("//tei:teiHeader//tei:sourceDesc/tei:bibl/tei:ref/@target")
+# texte d'un <author> (évaluée pour chaque auteur)
+author_text = counted_xpath(".//text()")
+
+# Métadonnées d'une mazarinade utilisées dans les éléments <TEI> des fiches d'imprimeurs :
+# - publishers : les @ref des <publisher> (identifiants des imprimeurs), sans doublons
+# - ident : le @xml:id de la mazarinade
+# - title : le titre principal
+# - authors : les auteurs, sous forme de couples (@ref ou None, nom complet)
+# - pages : le nombre de pages
+# - deco : le nombre de <figure @type="decoration"> (marques d'imprimeur)
+# - repository : le lieu et le nom de l'institution de conservation
+# - idno : le lien vers la numérisation
+# - names : les noms des <publisher> sans @ref, sans doublons
+Mazarinade = namedtuple("Mazarinade", ["publishers", "ident", "title", "authors", "pages", "deco", "repository",
+                                       "idno", "names"])
+
+# version du format des données enregistrées dans le cache : à incrémenter si Mazarinade, l'extraction ou la
+# génération des fiches changent
+cache_version = 2
+
+tei_header = "{%s}teiHeader" % ns['tei']
+tei_text = "{%s}text" % ns['tei']
+tei_body = "{%s}body" % ns['tei']
+tei_p = "{%s}p" % ns['tei']
+tei_figure = "{%s}figure" % ns['tei']
+tei_tei = "{%s}TEI" % ns['tei']
+tei_div = "{%s}div" % ns['tei']
+# éléments du texte dont les enfants sont libérés dès qu'ils sont complets par stream_mazarinade
+text_containers = {tei_text, tei_body, tei_div}
+# taille à partir de laquelle stream_mazarinade lit un fichier en flux : les fichiers plus petits sont parsés
+# entièrement, plus rapidement et sans coût notable en mémoire
+stream_min_size = 1 << 20
+xml_id = "{http://www.w3.org/XML/1998/namespace}id"
+
+# identifiants geonames des villes des imprimeurs
+cities = {
+    "Anvers": "geonames:2803138",
+    "Bordeaux": "geonames:3031582",
+    "Chalon-sur-Saône": "geonames:3027484",
+    "Dijon": "geonames:3021372",
+    "Lyon": "geonames:2996944",
+    "Marseille": "geonames:2995469",
+    "Orléans": "geonames:2989317",
+    "Paris": "geonames:2988507",
+    "Poitiers": "geonames:2986495",
+    "Pontoise": "geonames:2986140",
+    "Rennes": "geonames:2983990",
+    "Rouen": "geonames:2982652",
+    "Saumur": "geonames:2975758",
+    "Sens": "geonames:2975050",
+    "Toul": "geonames:2972350",
+    "Toulouse": "geonames:2972315",
+    "Tours": "geonames:2972191",
+    "Den Haag": "geonames:2747373"
+}
+
+spaces = re.compile(r"\s{2,}")
+
+
+def clean_text(text):
+    """
+    Supprime les retours à la ligne et réduit les espaces multiples d'un texte extrait des mazarinades.
+    """
 
-    return all_titles
+    return spaces.sub(" ", text.replace("\n", ""))
 
 
-def get_maz_author(doc):
-    """ Cette fonction va chercher les auteurs des mazarinades pour chaque imprimeur.
-    Elle sert à enrichir les éléments <TEI> du <teiCorpus> des fiches d'imprimeurs.
-    Retourne un dictionnaire dans un dictionnaire (nested dict):
-    - en clé (ident) du premier dictionnaire = l'identifiant de l'imprimeur
-    - en valeur = le deuxième dictionnaire
-        - en clé du deuxième dictionnaire = variable "author_ids" contenant l'identifiant
-        de l'auteur s'il en a un, ou la chaîne de caractères "id" s'il n'y en a pas.
-        - en valeur (author_name) du deuxième dictionnaire = le nom complet de l'auteur
-    """
-
-    printers = doc.xpath("//tei:teiHeader//tei:sourceDesc/tei:bibl/tei:publisher", namespaces=ns)
-
-    all_authors = {}
-    for printer in printers:
-        ident = printer.get("ref")
-        if ident not in all_authors:
-            all_authors[ident] = {}
-            authors = doc.xpath("//tei:teiHeader//tei:sourceDesc/tei:bibl//tei:author", namespaces=ns)
-            for author in authors:
-                if author.xpath("./@ref", namespaces=ns):
-                    author_ids = author.xpath("./@ref", namespaces=ns)[0]
-                    author_name = author.xpath(".//text()", namespaces=ns)
-                    all_authors[ident][author_ids] = author_name
-                else:
-                    author_name = author.xpath(".//text()", namespaces=ns)
-                    all_authors[ident]["id"] = author_name
-    return all_authors
-
-
-def get_maz_pages(doc):
-    """
-    Cette fonction va chercher le nombre de pages des mazarinades pour chaque imprimeur.
-    Elle sert à enrichir les éléments <TEI> du <teiCorpus> des fiches d'imprimeurs.
-    Retourne un dictionnaire:
-    - en clé (ident) = l'identifiant de l'imprimeur
-    - en valeur (page) = le nombre de pages des mazarinades qu'il a imprimées
+def get_maz_metadata(doc):
     """
+    Cette fonction récupère en un seul passage toutes les métadonnées d'une mazarinade utilisées pour enrichir les
+    éléments <TEI> du <teiCorpus> des fiches d'imprimeurs.
+    Retourne un tuple nommé Mazarinade.
+    """
+
+    printers = maz_publishers(doc)
+    publishers = tuple(dict.fromkeys(printer.get("ref") for printer in printers))
+    names = tuple(dict.fromkeys(clean_text(" ".join(printer.itertext())).strip() for printer in printers
+                                if not printer.get("ref")))
+
+    # les auteurs sans @ref sont regroupés sous une seule entrée, comme les auteurs ayant le même @ref
+    authors = {}
+    for author in maz_authors(doc):
+        authors[author.get("ref")] = ' '.join(author_text(author))
+
+    # lieu et institution de conservation, séparés par une virgule
+    repos = [clean_text(repo) for repo in maz_settlements(doc)] + [","] + \
+            [clean_text(repo) for repo in maz_institutions(doc)]
+
+    return Mazarinade(
+        publishers=publishers,
+        ident="".join(corresp.replace(" ", "") for corresp in maz_id(doc)),
+        title=clean_text("".join(maz_titles(doc))),
+        authors=tuple(authors.items()),
+        pages=", ".join(clean_text(page) for page in maz_pages(doc)),
+        deco=int(maz_decos(doc)),
+        repository=' '.join(repos).replace(" ,", ","),
+        idno=" ".join(maz_idnos(doc)),
+        names=tuple(name for name in names if name),
+    )
+
+
+def read_mazarinade(file):
+    """
+    Parse le fichier TEI d'une mazarinade et en extrait les métadonnées.
+    Retourne un tuple nommé Mazarinade (et non l'arbre XML, pour pouvoir être renvoyé par un processus de travail).
+    """
+
+    parser = etree.XMLParser(remove_blank_text=True)
+    with profiler.stage("parse"):
+        doc = etree.parse(file, parser)
+    profiler.count("files_parsed")
+    with profiler.stage("xpath"):
+        return get_maz_metadata(doc)
 
-    printers = doc.xpath("//tei:teiHeader//tei:sourceDesc/tei:bibl/tei:publisher", namespaces=ns)
-
-    all_pages = {}
-    for printer in printers:
-        ident = printer.get("ref")
-        if ident not in all_pages:
-            all_pages[ident] = []
-            pages = doc.xpath("//tei:teiHeader//tei:sourceDesc/tei:bibl/tei:extent/tei:measure/@quantity",
-                              namespaces=ns)
-            for page in pages:
-                page = re.sub("\n", "", page)
-                page = re.sub("\s{2,}", " ", page)
-                all_pages[ident].append(page)
 
-    return all_pages
+def body_decoration(figure):
+    """
+    Indique si une <figure> est une marque d'imprimeur comptée par maz_decos : une <figure @type="decoration">
+    ayant parmi ses ancêtres un <p> enfant d'un <body>.
+    """
 
+    return figure.get("type") == "decoration" and \
+        any(ancestor.tag == tei_p and ancestor.getparent().tag == tei_body for ancestor in figure.iterancestors())
 
-def get_maz_deco(doc):
-    """Cette fonction va chercher le nombre de <figure @type="decoration> (marque d'imprimeur) des mazarinades
-    pour chaque imprimeur.
-    Elle sert à enrichir les éléments <TEI> du <teiCorpus> des fiches d'imprimeurs.
-    Retourne un dictionnaire:
-    - en clé (ident) = l'identifiant de l'imprimeur
-    - en valeur (deco_number) = le nombre (compte) de marques d'imprimeurs trouvées dans les mazarinades qu'il
-    a imprimées
-    """
-
-    printers = doc.xpath("//tei:teiHeader//tei:sourceDesc/tei:bibl/tei:publisher", namespaces=ns)
-
-    all_deco = {}
-    for printer in printers:
-        ident = printer.get("ref")
-        if ident not in all_deco:
-            all_deco[ident] = []
-            decos = doc.xpath("//tei:text//tei:body/tei:p//tei:figure[@type='decoration']", namespaces=ns)
 
-            for deco in decos:
-                deco_number = decos.count(deco)
-                all_deco[ident].append(deco_number)
-                # solution provisoire pour les cas où on a deux marques d'imprimeur
-                if all_deco[ident][1:]:
-                    all_deco[ident] = [2]
-
-    return all_deco
+def stream_mazarinade(file):
+    """
+    Lit le fichier TEI d'une mazarinade en flux (etree.iterparse), sans garder le texte en mémoire : les
+    métadonnées sont extraites du <teiHeader> dès qu'il est complet, les <figure @type="decoration"> sont comptées
+    à leur fin, et chaque enfant complet d'un <text>, d'un <body> ou d'un <div> (paragraphe, strophe, titre,
+    division...) est vidé puis supprimé.
+    Les fichiers de moins de stream_min_size octets sont lus avec read_mazarinade.
+    Retourne un tuple nommé Mazarinade, identique à celui de read_mazarinade.
+    """
 
-
-def get_maz_repo(doc):
-    """
-    Cette fonction va chercher l'institution de conservation des mazarinades pour chaque imprimeur.
-    Elle sert à enrichir les éléments <TEI> du <teiCorpus> des fiches d'imprimeurs.
-    Retourne un dictionnaire:
-    - en clé (ident) = l'identifiant de l'imprimeur
-    - en valeur (repo) = le lieu et le nom de l'institution de conservation des mazarinades qu'il a imprimées
+    if os.path.getsize(file) < stream_min_size:
+        return read_mazarinade(file)
+
+    maz = None
+    deco = 0
+    context = etree.iterparse(file, events=("end",), remove_blank_text=True)
+    with profiler.stage("parse"):
+        for event, elem in context:
+            parent = elem.getparent()
+            if parent is None:
+                continue
+            tag = elem.tag
+            if tag == tei_header:
+                # seul le <teiHeader> de la mazarinade (enfant de <TEI>) nous intéresse
+                if maz is None and parent.getparent() is None:
+                    with profiler.stage("xpath"):
+                        maz = get_maz_metadata(elem)
+            elif tag == tei_figure and body_decoration(elem):
+                deco += 1
+            if parent.tag in text_containers:
+                # élément du texte complet (ses marques d'imprimeur sont déjà comptées) : on le libère, ainsi que
+                # ceux qui le précèdent
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del parent[0]
+    del context
+    profiler.count("files_parsed")
+
+    if maz is None:
+        # mazarinade sans <teiHeader> : on se rabat sur la lecture complète
+        return read_mazarinade(file)
+    return maz._replace(deco=deco)
+
+
+def open_cache(path):
+    """
+    Ouvre (ou crée) le cache SQLite des métadonnées extraites des mazarinades. Chaque fichier y est enregistré avec
+    sa taille et sa date de modification, qui servent à savoir s'il doit être relu. Le cache contient aussi les
+    empreintes des fiches d'imprimeurs utilisées par le mode incrémental de to_tei.
+    Le cache est vidé si la version des métadonnées (cache_version) a changé.
+    Retourne la connexion SQLite.
     """
 
-    printers = doc.xpath("//tei:teiHeader//tei:sourceDesc/tei:bibl/tei:publisher", namespaces=ns)
+    connection = sqlite3.connect(path)
+    if connection.execute("PRAGMA user_version").fetchone()[0] != cache_version:
+        connection.execute("DROP TABLE IF EXISTS mazarinades")
+        connection.execute("DROP TABLE IF EXISTS printers")
+        connection.execute("PRAGMA user_version = %d" % cache_version)
+    connection.execute("CREATE TABLE IF NOT EXISTS mazarinades (path TEXT PRIMARY KEY, size INTEGER, "
+                       "mtime INTEGER, metadata TEXT)")
+    connection.execute("CREATE TABLE IF NOT EXISTS printers (name TEXT PRIMARY KEY, fingerprint TEXT)")
+    return connection
 
-    all_repo = {}
-    for printer in printers:
-        ident = printer.get("ref")
-        if ident not in all_repo:
-            all_repo[ident] = []
-            repos1 = doc.xpath("//tei:teiHeader//tei:sourceDesc/tei:msDesc/tei:msIdentifier/tei:settlement/text()",
-                               namespaces=ns)
-            repos2 = doc.xpath("//tei:teiHeader//tei:sourceDesc/tei:msDesc/tei:msIdentifier/tei:institution/text()",
-                               namespaces=ns)
-            virgule = [","]
-            repos = repos1 + virgule + repos2
-            for repo in repos:
-                repo = re.sub("\n", "", repo)
-                repo = re.sub("\s{2,}", " ", repo)
-                all_repo[ident].append(repo)
-
-        return all_repo
 
+def decode_mazarinade(data):
+    """
+    Reconstruit un tuple nommé Mazarinade à partir de sa forme JSON enregistrée dans le cache.
+    """
+
+    maz = Mazarinade(*json.loads(data))
+    return maz._replace(publishers=tuple(maz.publishers), authors=tuple(tuple(author) for author in maz.authors),
+                        names=tuple(maz.names))
 
-def get_maz_idno(doc):
+
+def index_mazarinades(pattern="./Mazarinades/**/*.xml", workers=1, stream=False, cache=None, crosswalk=None,
+                      names=None):
     """
-    Cette fonction va chercher les liens vers les numérisations des mazarinades pour chaque imprimeur.
-    Elle sert à enrichir les éléments <TEI> du <teiCorpus> des fiches d'imprimeurs.
-    Retourne un dictionnaire:
-    - en clé (ident) = l'identifiant de l'imprimeur
-    - en valeur (idno) = le lien des numérisations des mazarinades qu'il a imprimées
+    Cette fonction parse une seule fois chacun des fichiers TEI des mazarinades et construit un index des
+    mazarinades par imprimeur, afin de ne pas reparcourir tout le corpus pour chaque ligne du TSV.
+    Si workers est supérieur à 1, les fichiers sont parsés par paquets dans autant de processus.
+    Si stream est vrai, les fichiers sont lus en flux (stream_mazarinade) plutôt que parsés entièrement.
+    Si cache est le chemin d'un fichier SQLite, les métadonnées y sont conservées d'une exécution à l'autre et seuls
+    les fichiers ajoutés ou modifiés (taille ou date de modification différente) sont relus.
+    Si crosswalk est une table de correspondance des identifiants (Crosswalk), les @ref des <publisher> sont
+    ramenés à la clé de l'imprimeur, quelle que soit la forme de l'identifiant (isni:..., adresse VIAF, ARK BnF...).
+    Si names est un index des noms d'imprimeurs (NameIndex), les <publisher> sans @ref de tout le corpus sont reliés
+    en une seule passe à l'imprimeur dont le nom correspond, et leurs mazarinades sont ajoutées à la clé de cet
+    imprimeur dans l'index.
+    Retourne un dictionnaire :
+    - en clé = l'identifiant de l'imprimeur (@ref du <publisher>)
+    - en valeur = la liste des métadonnées (tuples Mazarinade) des mazarinades qu'il a imprimées, dans l'ordre des
+    fichiers
     """
 
-    printers = doc.xpath("//tei:teiHeader//tei:sourceDesc/tei:bibl/tei:publisher", namespaces=ns)
-    all_idno = {}
-    for printer in printers:
-        ident = printer.get("ref")
-        if ident not in all_idno:
-            all_idno[ident] = []
-            idnos = doc.xpath("//tei:teiHeader//tei:sourceDesc/tei:bibl/tei:ref/@target",
-                              namespaces=ns)
-            for idno in idnos:
-                all_idno[ident].append(idno)
+    index = {}
+    with profiler.stage("glob"):
+        files = glob.glob(pattern, recursive=True)
+    reader = stream_mazarinade if stream else read_mazarinade
+
+    # on récupère dans le cache les métadonnées des fichiers qui n'ont pas changé
+    metadata = {}
+    stats = {}
+    if cache:
+        connection = open_cache(cache)
+        cached = {path: (size, mtime, data) for path, size, mtime, data in
+                  connection.execute("SELECT path, size, mtime, metadata FROM mazarinades")}
+        for file in files:
+            stat = os.stat(file)
+            stats[file] = (stat.st_size, stat.st_mtime_ns)
+            if file in cached and cached[file][:2] == stats[file]:
+                metadata[file] = decode_mazarinade(cached[file][2])
+    to_read = [file for file in files if file not in metadata]
+    profiler.count("mazarinades_cached", len(metadata))
+
+    if workers > 1 and len(to_read) > 1:
+        # on envoie les fichiers par paquets pour limiter les échanges entre processus ; map() conserve l'ordre
+        # des fichiers
+        chunksize = max(1, len(to_read) // (workers * 4))
+        # les processus de travail ne sont pas instrumentés : leur lecture est mesurée en bloc comme étape parse
+        with profiler.stage("parse"), ProcessPoolExecutor(max_workers=workers, initializer=disable_profiler) \
+                as executor:
+            metadata.update(zip(to_read, executor.map(reader, to_read, chunksize=chunksize)))
+        profiler.count("files_parsed", len(to_read))
+    else:
+        metadata.update(zip(to_read, map(reader, to_read)))
+
+    # mise à jour du cache : ajout des fichiers relus, suppression des fichiers disparus
+    if cache:
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO mazarinades VALUES (?, ?, ?, ?)",
+                                   ((file,) + stats[file] + (json.dumps(metadata[file]),) for file in to_read))
+            connection.executemany("DELETE FROM mazarinades WHERE path = ?",
+                                   ((path,) for path in cached if path not in stats))
+        connection.close()
+
+    links = {}
+    if names is not None:
+        links = names.link(name for file in files for name in metadata[file].names)
 
-    return all_idno
+    for file in files:
+        maz = metadata[file]
+        idents = maz.publishers
+        if crosswalk is not None:
+            idents = tuple(dict.fromkeys(crosswalk.resolve(ident) or ident for ident in idents))
+        if links:
+            idents = tuple(dict.fromkeys(idents + tuple(links[name] for name in maz.names if name in links)))
+        for ident in idents:
+            index.setdefault(ident, []).append(maz)
 
+    return index
 
-def to_tei():
+
+def get_xmlid(row):
+    """
+    Construit le @xml:id d'un imprimeur à partir de son nom et de son prénom (sans espaces, ponctuation ni
+    accents). Il sert aussi de nom au fichier de sa fiche.
+    """
+
+    fullname2 = row[0] + row[1]
+    fullname2 = re.sub(" |\(|\)|'|’|-|,|\.", "", fullname2)
+    fullname2 = re.sub("é|è|ë|ê", "e", fullname2)
+    fullname2 = re.sub("É|È|Ë|Ê", "E", fullname2)
+    fullname2 = re.sub("ç|Ç", "c", fullname2)
+    fullname2 = re.sub("ô|Ô", "o", fullname2)
+    return "IL_" + fullname2
+
+
+def index_printers(path="../CSV/Antonomaz/base_imprimeurs_joined.tsv", link_names=False):
+    """
+    Lit une première fois la base imprimeurs pour construire les index utilisés pour relier les mazarinades aux
+    imprimeurs. La clé d'un imprimeur est son identifiant (colonne ISNI, sous la forme isni:...), ou à défaut son
+    @xml:id.
+    Retourne un couple :
+    - la table de correspondance (Crosswalk) de tous les identifiants des imprimeurs (ISNI, VIAF, BnF, IdRef)
+    - l'index des formes du nom des imprimeurs (NameIndex) si link_names est vrai, sinon None
+    """
+
+    crosswalk = Crosswalk()
+    names = NameIndex() if link_names else None
+    with open(path) as csvfile:
+        csvreader = csv.reader(csvfile, delimiter="\t")
+        next(csvreader, None)  # cette ligne sert à ne pas lire les headers du fichier
+        for row in csvreader:
+            key = row[14] or get_xmlid(row)
+            crosswalk.add(key, [row[14], row[13], row[12]] + split_identifiers(row[15]))
+            crosswalk.add(key, [row[16]], scheme="bnf")
+            if names is not None:
+                names.add(row[0] + ', ' + row[1], key)
+                for nom in row[2].split("',"):
+                    names.add(re.sub("^'|'$", "", nom), key)
+    return crosswalk, names
+
+
+def write_if_changed(path, output):
+    """
+    Écrit le contenu output (en octets) dans le fichier path, sauf si le fichier contient déjà exactement ce contenu.
+    Retourne True si le fichier a été écrit.
+    """
+
+    try:
+        with open(path, "rb") as existing:
+            if existing.read() == output:
+                profiler.count("files_unchanged")
+                return False
+    except FileNotFoundError:
+        pass
+    with open(path, "wb") as sortie_xml:
+        sortie_xml.write(output)
+    profiler.count("files_written")
+    profiler.count("bytes_written", len(output))
+    return True
+
+
+def build_template(skeleton, slots):
+    """
+    Prépare un squelette d'éléments TEI, construit une seule fois, qui est ensuite copié (clone_template) pour chaque
+    fiche ou chaque mazarinade au lieu d'être reconstruit élément par élément. Les emplacements à remplir (slots :
+    nom de l'emplacement -> élément du squelette) sont repérés par leur position dans le squelette.
+    Retourne un couple (squelette, positions des emplacements).
+    """
+
+    elements = list(skeleton.iter())
+    return skeleton, {name: elements.index(element) for name, element in slots.items()}
+
+
+def clone_template(template):
+    """
+    Copie un squelette préparé par build_template.
+    Retourne un couple (copie du squelette, dictionnaire nom de l'emplacement -> élément de la copie).
+    """
+
+    skeleton, positions = template
+    clone = deepcopy(skeleton)
+    elements = list(clone.iter())
+    return clone, {name: elements[position] for name, position in positions.items()}
+
+
+def header_template():
+    """
+    Construit le squelette du <teiHeader> des fiches d'imprimeurs : tous les éléments fixes (<editionStmt>,
+    <publicationStmt>, <occupation>, <country>, <revisionDesc>...) sont déjà en place, et les éléments qui
+    dépendent de la ligne du TSV sont renseignés par printer_header.
+    Retourne le squelette et ses emplacements (voir build_template).
+    """
+
+    teiheader = etree.Element('teiHeader')
+
+    # <fileDesc>
+    filedesc = etree.SubElement(teiheader, 'fileDesc')
+
+    # <titleStmt>
+    titlestmt = etree.SubElement(filedesc, 'titleStmt')
+    title1 = etree.SubElement(titlestmt, 'title')
+    title1.set('type', 'standard')
+    forename1 = etree.SubElement(title1, 'forename')
+    surname1 = etree.SubElement(title1, 'surname')
+
+    # <editionStmt> : on y indique les informations sur la
+    # création des fiches imprimeurs en TEI
+    editionstmt = etree.SubElement(filedesc, 'editionStmt')
+    edition = etree.SubElement(editionstmt, 'edition')
+    respstmt = etree.SubElement(editionstmt, 'respStmt')
+    respstmt.set(xml_id, 'ZC')
+    respstmt.set('ref', 'orcid:0000-0002-3327-3967')
+    name = etree.SubElement(respstmt, 'name')
+    name.text = 'Zoé Cappe'
+    resp = etree.SubElement(respstmt, 'resp')
+    resp.text = 'Créateur de la fiche'
+
+    # <publicationStmt> : on y indique les informations sur le contexte de création
+    # desdites fiches, soit le projet Antonomaz
+    publicationstmt = etree.SubElement(filedesc, 'publicationStmt')
+    publisher = etree.SubElement(publicationstmt, 'publisher')
+    publisher.set('ref', 'https://github.com/Antonomaz')
+    publisher.set(xml_id, 'Antonomaz')
+    publisher.text = 'Antonomaz'
+    availability = etree.SubElement(publicationstmt, 'availability')
+    availability.set('status', 'restricted')
+    availability.set('n', 'cc-by')
+    licence = etree.SubElement(availability, 'licence')
+    licence.set('target', 'https://creativecommons.org/licenses/by/4.0')
+
+    # <sourceDesc> : contient un <listBibl>, qui lui-même contient un élément
+    # <bibl> pour chacun des identifiants de l'imprimeur
+    sourcedesc = etree.SubElement(filedesc, 'sourceDesc')
+    listbibl = etree.SubElement(sourcedesc, 'listBibl')
+
+    # <profileDesc> : contient, dans un <particDesc>, puis <listPerson>,
+    # puis <person>, les diverses informations sur la vie de l'imprimeur
+    profiledesc = etree.SubElement(teiheader, 'profileDesc')
+    particdesc = etree.SubElement(profiledesc, 'particDesc')
+    listperson = etree.SubElement(particdesc, 'listPerson')
+    person = etree.SubElement(listperson, 'person')
+    persname1 = etree.SubElement(person, 'persName')
+    persname1.set('type', 'standard')
+    sex = etree.SubElement(person, 'sex')
+    birth = etree.SubElement(person, 'birth')
+    death = etree.SubElement(person, 'death')
+
+    # les fiches ne concernant que des imprimeurs-libraires, l'élément
+    # <occupation> prend "Imprimeur-libraire" comme valeur par défaut.
+    occupation = etree.SubElement(person, 'occupation')
+    occupation.text = "Imprimeur-libraire"
+
+    # éléments d'adresse : <objectName>, <street>, <settlement> et <country> (France par défaut)
+    residence = etree.SubElement(person, 'residence')
+    address = etree.SubElement(residence, 'address')
+    objectname = etree.SubElement(address, 'objectName')
+    street = etree.SubElement(address, 'street')
+    settlement = etree.SubElement(address, 'settlement')
+    country = etree.SubElement(address, 'country')
+    country.text = "France"
+
+    listevent = etree.SubElement(person, 'listEvent')
+
+    # <revisionDesc> : permet d'indiquer la date la responsabilité de la création de
+    # la fiche et des éventuels changements effectués ensuite
+    revisiondesc = etree.SubElement(teiheader, 'revisionDesc')
+    listchange = etree.SubElement(revisiondesc, 'listChange')
+    change = etree.SubElement(listchange, 'change')
+    change.set('when', '2022-07-10')
+    change.set('who', '#ZC')
+    change.text = "Création de la fiche"
+
+    return build_template(teiheader, {
+        'title': title1, 'forename': forename1, 'surname': surname1, 'listbibl': listbibl, 'persname': persname1,
+        'sex': sex, 'birth': birth, 'death': death, 'residence': residence, 'objectname': objectname,
+        'street': street, 'settlement': settlement, 'listevent': listevent,
+    })
+
+
+def maz_template():
+    """
+    Construit le squelette de l'élément <TEI> d'une mazarinade : le <publicationStmt> (projet Antonomaz), le
+    <msDesc> et le <text> sont fixes, les autres éléments sont renseignés par maz_to_tei.
+    Retourne le squelette et ses emplacements (voir build_template).
+    """
+
+    tei = etree.Element('TEI')
+
+    # <teiHeader> : métadonnées des mazarinades
+    teiheader2 = etree.SubElement(tei, 'teiHeader')
+    filedesc2 = etree.SubElement(teiheader2, 'fileDesc')
+    # <titleStmt>
+    titlestmt2 = etree.SubElement(filedesc2, 'titleStmt')
+    # titre des mazarinades
+    title2 = etree.SubElement(titlestmt2, 'title')
+
+    # <extent> : informations matérielles des mazarinades (nombre de pages et de marques d'imprimeur)
+    extent = etree.SubElement(filedesc2, 'extent')
+    measure1 = etree.SubElement(extent, 'measure')
+    measure1.set('unit', 'pages')
+    measure2 = etree.SubElement(extent, 'measure')
+    measure2.set('unit', 'decoration')
+
+    # <publicationStmt> : informations sur le contexte de diffusion des mazarinades dans leur encodage (projet
+    # Antonomaz)
+    publicationstmt = etree.SubElement(filedesc2, 'publicationStmt')
+    publisher = etree.SubElement(publicationstmt, 'publisher')
+    publisher.set('ref', 'https://github.com/Antonomaz')
+    publisher.text = 'Antonomaz'
+    availability = etree.SubElement(publicationstmt, 'availability')
+    availability.set('status', 'restricted')
+    availability.set('n', 'cc-by')
+    licence = etree.SubElement(availability, 'licence')
+    licence.set('target', 'https://creativecommons.org/licenses/by/4.0')
+
+    # <sourceDesc> : institution de conservation et lien vers la numérisation
+    sourcedesc2 = etree.SubElement(filedesc2, 'sourceDesc')
+    msdesc = etree.SubElement(sourcedesc2, 'msDesc')
+    msidentifier = etree.SubElement(msdesc, 'msIdentifier')
+    repository = etree.SubElement(msidentifier, 'repository')
+    idno = etree.SubElement(msidentifier, 'idno')
+
+    physdesc = etree.SubElement(msdesc, 'physDesc')
+    decodesc = etree.SubElement(physdesc, 'decoDesc')
+    deconote = etree.SubElement(decodesc, 'decoNote')
+    text = etree.SubElement(tei, 'text')
+    body = etree.SubElement(text, 'body')
+    div = etree.SubElement(body, 'div')
+
+    return build_template(tei, {
+        'titlestmt': titlestmt2, 'title': title2, 'pages': measure1, 'decoration': measure2,
+        'repository': repository, 'idno': idno,
+    })
+
+
+def empty_maz_tei():
+    """
+    Construit l'élément <TEI> neutre ajouté dans les fiches des imprimeurs pour lesquels on n'a pas de mazarinade.
+    Tous les attributs et les éléments ont des valeurs neutres quand des valeurs doivent être renseignées.
+    Retourne l'élément.
+    """
+
+    tei = etree.Element('TEI', attrib={'corresp': 'none'})
+    teiheader = etree.SubElement(tei, 'teiHeader')
+    filedesc = etree.SubElement(teiheader, 'fileDesc')
+    titleStmt = etree.SubElement(filedesc, 'titleStmt')
+    title = etree.SubElement(titleStmt, 'title')
+    author = etree.SubElement(titleStmt, 'author', attrib={'ref': 'isni:0000'})
+    extent = etree.SubElement(filedesc, 'extent')
+    measure = etree.SubElement(extent, 'measure', attrib={'unit': 'pages', 'quantity': '0'})
+    publicationstmt = etree.SubElement(filedesc, 'publicationStmt')
+    publisher = etree.SubElement(publicationstmt, 'publisher', attrib={'ref': 'https://github.com/Antonomaz'})
+    publisher.text = 'Antonomaz'
+    availability = etree.SubElement(publicationstmt, 'availability', attrib={'status': 'restricted',
+                                                                             'n': 'cc-by'})
+    licence = etree.SubElement(availability, 'licence', attrib={
+        'target': 'https://creativecommons.org/licenses/by/4.0'})
+    sourcedesc = etree.SubElement(filedesc, 'sourceDesc')
+    msdesc = etree.SubElement(sourcedesc, 'msDesc')
+    msidentifier = etree.SubElement(msdesc, 'msIdentifier')
+    repository = etree.SubElement(msidentifier, 'repository')
+    repository.text = 'Sans lieu'
+    idno = etree.SubElement(msidentifier, 'idno', attrib={'source': 'None'})
+    physdesc = etree.SubElement(msdesc, 'physDesc')
+    decodesc = etree.SubElement(physdesc, 'decoDesc')
+    deconote = etree.SubElement(decodesc, 'decoNote')
+    text = etree.SubElement(tei, 'text')
+    body = etree.SubElement(text, 'body')
+    div = etree.SubElement(body, 'div')
+
+    return tei
+
+
+# squelettes construits une seule fois, puis copiés pour chaque fiche et chaque mazarinade
+printer_header_template = header_template()
+maz_tei_template = maz_template()
+empty_maz_template = build_template(empty_maz_tei(), {})
+
+
+def printer_header(row):
+    """
+    Construit le <teiHeader> de la fiche d'un imprimeur, à partir d'une copie du squelette (header_template) dont
+    on renseigne les éléments avec la ligne du TSV.
+    Retourne l'élément.
+    """
+
+    teiheader, slot = clone_template(printer_header_template)
+
+    # récupération de l'isni/viaf sous forme isni:0000, renseigné
+    # dans l'@ref du <title>
+    isni = row[14]
+    if isni:
+        slot['title'].set('ref', isni)
+    else:
+        slot['title'].set('ref', 'isni:0000')
+
+    # récupération du prénom et du nom de l'imprimeur, renseignés dans les éléments <forename> et <surname>
+    prenom = row[1]
+    if prenom:
+        slot['forename'].text = prenom
+    nom = row[0]
+    if nom:
+        slot['surname'].text = nom
+
+    # <listBibl> : un élément <bibl> pour chacun des identifiants de l'imprimeur, renseignés dans des @source
+    listbibl = slot['listbibl']
+    for identifiant in split_identifiers(row[15]):
+        bibl = etree.SubElement(listbibl, 'bibl')
+        bibl.set('source', identifiant or 'none')
+    idref = row[12]
+    if idref:
+        bibl = etree.SubElement(listbibl, 'bibl')
+        bibl.set('source', idref)
+
+    # persName @type="standard" : contient forme normale du nom
+    slot['persname'].text = row[0] + ', ' + row[1]
+
+    # persName @type="alternative" : s'il y en a, contient les autres
+    # formes du nom (ajoutés avant l'élément <sex>)
+    sex = slot['sex']
+    for list_nom in row[2].split("',"):
+        persname2 = etree.Element('persName')
+        persname2.set('type', 'alternative')
+        list_nom = re.sub("^'", "", list_nom)
+        list_nom = re.sub("'$", "", list_nom)
+        persname2.text = list_nom
+        sex.addprevious(persname2)
+
+    # récupération du genre de l'imprimeur dans un élément <sex>
+    sex.text = row[5]
+
+    # récupération des dates de naissance et de mort s'il y en a dans les éléments
+    # <birth> et <death>. Si la date est connue, elle est renseignée dans un @when avec
+    # un @cert qui a pour valeur "high". Si elle est inconnue, le @when a pour
+    # valeur par défaut 1600 (naissance) ou 1700 (mort) et le @cert la valeur "low".
+    birth_date = row[3]
+    if birth_date:
+        slot['birth'].set('when', birth_date)
+        slot['birth'].set('cert', 'high')
+    else:
+        slot['birth'].set('when', '1600')
+        slot['birth'].set('cert', 'low')
+    death_date = row[4]
+    if death_date:
+        slot['death'].set('when', death_date)
+        slot['death'].set('cert', 'high')
+    else:
+        slot['death'].set('when', '1700')
+        slot['death'].set('cert', 'low')
+
+    # les éléments d'adresse (enseigne, rue, ville, indication) sont renseignés dans
+    # les éléments <objectName>, <street> et <settlement>
+    enseigne = row[9]
+    get_address = row[7] + ' ; ' + row[8]
+    rue = row[7]
+    indication = row[8]
+    city = row[6]
+
+    if enseigne and city and get_address:
+        slot['residence'].set('cert', 'high')
+    elif get_address and city:
+        slot['residence'].set('cert', 'high')
+    else:
+        slot['residence'].set('cert', 'low')
+
+    # ajout de l'enseigne s'il y en a une
+    if enseigne:
+        slot['objectname'].text = enseigne
+    # ajout de l'adresse s'il y en a une
+    street = slot['street']
+    if rue and indication:
+        street.text = rue + "  ; " + indication
+    elif rue:
+        street.text = rue
+    elif indication:
+        street.text = indication
+    # récupération du nom de la ville et son geonames
+    settlement = slot['settlement']
+    if city:
+        settlement.text = city
+        if city in cities:
+            settlement.set('ref', cities[city])
+    else:
+        settlement.set('ref', 'geonames:0000')
+
+    # ajout des éléments biographiques provenant d'Idref
+    bio = row[11]
+
+    listevent = slot['listevent']
+    event = etree.SubElement(listevent, 'event')
+    label = etree.SubElement(event, 'label')
+    label.set('type', 'bio')
+    if bio:
+        label.set('source', 'IdRef')
+        bio = re.sub("^'", "", bio)
+        bio = re.sub("'$", "", bio)
+        label.text = bio
+
+    # ajout des éléments biographiques provenant d'Antonomaz (notes)
+    note = row[10]
+
+    if note:
+        event = etree.SubElement(listevent, 'event')
+        label = etree.SubElement(event, 'label')
+        label.set('type', 'bio')
+        label.set('source', 'Antonomaz')
+        label.text = note
+
+    return teiheader
+
+
+def maz_to_tei(maz):
+    """
+    Construit l'élément <TEI> d'une mazarinade, ajouté dans la fiche de chacun de ses imprimeurs, à partir d'une
+    copie du squelette (maz_template).
+    Retourne l'élément.
+    """
+
+    tei, slot = clone_template(maz_tei_template)
+
+    # la valeur du xml:id de la mazarinade est ajoutée à l'attribut @corresp
+    tei.set('corresp', maz.ident + '.xml')
+    slot['title'].text = maz.title
+
+    # auteur/auteurs des mazarinades
+    for author_id, author_name in maz.authors:
+        author = etree.SubElement(slot['titlestmt'], 'author')
+        author.set('ref', author_id or 'isni:0000')
+        author.text = author_name
+
+    # nombre de pages et présence ou absence d'une marque d'imprimeur (solution provisoire : on s'arrête à deux
+    # marques d'imprimeur)
+    slot['pages'].set('quantity', maz.pages or '0')
+    slot['decoration'].set('quantity', str(min(maz.deco, 2)))
+
+    # institution de conservation des mazarinades et lien vers leur numérisation
+    slot['repository'].text = maz.repository
+    slot['idno'].set('source', maz.idno or 'None')
+
+    return tei
+
+
+def write_printer(path, xmlid, teiheader, printed):
+    """
+    Écrit la fiche d'un imprimeur en flux (etree.xmlfile) : l'élément racine <teiCorpus> est ouvert avec le @xml:id
+    de l'imprimeur (qui correspond aussi au nom du fichier), puis on y écrit le <teiHeader> et, l'un après l'autre,
+    les <TEI> de ses mazarinades, de sorte qu'un seul <TEI> est en mémoire à la fois.
+    Si l'imprimeur n'a pas de mazarinade, la fiche (courte) contient le <TEI> neutre et elle est indentée, comme le
+    faisait add_empty_maz.
+    La fiche est écrite dans un fichier temporaire, qui ne remplace le fichier path que si son contenu a changé.
+    Retourne True si le fichier a été écrit.
+    """
+
+    if not printed:
+        with profiler.stage("serialization"):
+            buffer = io.BytesIO()
+            with etree.xmlfile(buffer, encoding="utf-8") as xf:
+                with xf.element('teiCorpus', {'xmlns': ns['tei'], 'xml:id': xmlid}):
+                    xf.write(teiheader)
+                    xf.write(clone_template(empty_maz_template)[0])
+            parser = etree.XMLParser(remove_blank_text=True)
+            doc = etree.fromstring(buffer.getvalue(), parser).getroottree()
+            output = etree.tostring(doc, pretty_print=True, encoding='utf-8', xml_declaration=True)
+        return write_if_changed(path, output)
+
+    temporary = path + ".tmp"
+    with profiler.stage("serialization"):
+        with etree.xmlfile(temporary, encoding="utf-8") as xf:
+            xf.write_declaration()
+            with xf.element('teiCorpus', {'xmlns': ns['tei'], 'xml:id': xmlid}):
+                xf.write(teiheader)
+                for maz in printed:
+                    with profiler.stage("tree"):
+                        tei = maz_to_tei(maz)
+                    xf.write(tei)
+
+    with profiler.stage("compare"):
+        unchanged = os.path.exists(path) and filecmp.cmp(temporary, path, shallow=False)
+    if unchanged:
+        os.remove(temporary)
+        profiler.count("files_unchanged")
+        return False
+    profiler.count("files_written")
+    profiler.count("bytes_written", os.path.getsize(temporary))
+    os.replace(temporary, path)
+    return True
+
+
+def to_tei(workers=1, stream=False, cache=None, incremental=False, link_names=False):
 
     """
     Cette fonction sert à créer automatiquement tout l'encodage des fiches des imprimeurs.
@@ -202,8 +821,37 @@ def to_tei():
     toutes les informations sur l'imprimeur récupérées dans la base imprimeurs (fichier TSV).
     Les élements <TEI> ajoutés à la suite du <teiHeader> contiennent les informations des mazarinades
     imprimées par cet imprimeur, si l'identifiant de l'imprimeur est renseigné dans les mazarinades.
+    Le paramètre workers indique le nombre de processus utilisés pour parser le corpus des mazarinades, et le
+    paramètre stream permet de lire les mazarinades en flux, sans garder leur texte en mémoire. Le paramètre cache
+    est le chemin du cache SQLite des métadonnées des mazarinades (aucun cache par défaut).
+    Si incremental est vrai (ce qui nécessite un cache, sinon ValueError est levée), on enregistre dans le cache une
+    empreinte de la ligne du TSV et des mazarinades de chaque imprimeur, et seules les fiches dont l'empreinte a
+    changé sont régénérées.
+    Chaque fiche est écrite en flux (write_printer) : le <teiHeader>, puis les <TEI> des mazarinades un par un.
+    Dans tous les cas, un fichier n'est réécrit que si son contenu a changé.
+    Si link_names est vrai, les mazarinades dont le <publisher> n'a pas de @ref sont aussi reliées aux imprimeurs
+    dont le nom (forme normale ou autre forme) correspond, y compris aux imprimeurs sans identifiant.
+    Retourne la liste des fiches générées.
     """
 
+    if incremental and not cache:
+        raise ValueError("le mode incrémental nécessite un cache")
+
+    # on indexe une seule fois les mazarinades par identifiant d'imprimeur
+    with profiler.stage("index_printers"):
+        crosswalk, names = index_printers(link_names=link_names)
+    with profiler.stage("index_mazarinades"):
+        mazarinades = index_mazarinades(workers=workers, stream=stream, cache=cache, crosswalk=crosswalk,
+                                        names=names)
+
+    # empreintes des données ayant servi à générer chaque fiche lors de la dernière exécution
+    fingerprints = {}
+    if incremental:
+        connection = open_cache(cache)
+        fingerprints = dict(connection.execute("SELECT name, fingerprint FROM printers"))
+    generated = []
+    new_fingerprints = {}
+
     # on ouvre le fichier CSV de la base imprimeurs
     with open("../CSV/Antonomaz/base_imprimeurs_joined.tsv") as csvfile:
         csvreader = csv.reader(csvfile, delimiter="\t")
@@ -211,460 +859,120 @@ def to_tei():
         for row in csvreader:
             # pour chaque ligne (chaque imprimeur) du CSV, on crée les éléments suivants en TEI
 
-            # Élément racine <teiCorpus> : contient les informations sur l'imprimeur
-            root = ET.Element('teiCorpus')
-            root.set('xmlns', 'http://www.tei-c.org/ns/1.0')
-
-            # <teiHeader> : contient les informations sur l'imprimeur
-            teiheader = ET.SubElement(root, 'teiHeader')
-
-            # <fileDesc>
-            filedesc = ET.SubElement(teiheader, 'fileDesc')
-
-            # <titleStmt>
-            titlestmt = ET.SubElement(filedesc, 'titleStmt')
-            title1 = ET.SubElement(titlestmt, 'title')
-            title1.set('type', 'standard')
-            # récupération de l'isni/viaf sous forme isni:0000, renseigné
-            # dans l'@ref du <title>
-            isni = row[14]
-            if isni:
-                title1.set('ref', isni)
-            else:
-                title1.set('ref', 'isni:0000')
-
-            # récupération du prénom de l'imprimeur, renseigné dans l'élément <forename>
-            forename1 = ET.SubElement(title1, 'forename')
-            prenom = row[1]
-            if prenom:
-                forename1.text = prenom
-
-            # récupération du nom de l'imprimeur, renseigné dans l'élément <surname>
-            surname1 = ET.SubElement(title1, 'surname')
-            nom = row[0]
-            if nom:
-                surname1.text = nom
-
-            # <editionStmt> : on y indique les informations sur la
-            # création des fiches imprimeurs en TEI
-            editionstmt = ET.SubElement(filedesc, 'editionStmt')
-            edition = ET.SubElement(editionstmt, 'edition')
-            respstmt = ET.SubElement(editionstmt, 'respStmt')
-            respstmt.set('xml:id', 'ZC')
-            respstmt.set('ref', 'orcid:0000-0002-3327-3967')
-            name = ET.SubElement(respstmt, 'name')
-            name.text = 'Zoé Cappe'
-            resp = ET.SubElement(respstmt, 'resp')
-            resp.text = 'Créateur de la fiche'
-
-            # <publicationStmt> : on y indique les informations sur le contexte de création
-            # desdites fiches, soit le projet Antonomaz
-            publicationstmt = ET.SubElement(filedesc, 'publicationStmt')
-            publisher = ET.SubElement(publicationstmt, 'publisher')
-            publisher.set('ref', 'https://github.com/Antonomaz')
-            publisher.set('xml:id', 'Antonomaz')
-            publisher.text = 'Antonomaz'
-            availability = ET.SubElement(publicationstmt, 'availability')
-            availability.set('status', 'restricted')
-            availability.set('n', 'cc-by')
-            licence = ET.SubElement(availability, 'licence')
-            licence.set('target', 'https://creativecommons.org/licenses/by/4.0')
-
-            # <sourceDesc> : contient un <listBibl>, qui lui-même contient un élément
-            # <bibl> pour chacun des identifiants de l'imprimeur, renseignés dans
-            # des @source
-            sourcedesc = ET.SubElement(filedesc, 'sourceDesc')
-            listbibl = ET.SubElement(sourcedesc, 'listBibl')
-            # récupération des différents identifiants, s'il y en a
-            autres_ids = row[15]
-            list_ids = list(autres_ids.split(","))
-            if list_ids:
-                for ident in range(len(list_ids)):
-                    identifiant = str(list_ids[ident])
-                    if identifiant:
-                        bibl = ET.SubElement(listbibl, 'bibl')
-                        bibl.set('source', identifiant)
-                    else:
-                        bibl = ET.SubElement(listbibl, 'bibl')
-                        bibl.set('source', 'none')
-            idref = row[12]
-            if idref:
-                bibl = ET.SubElement(listbibl, 'bibl')
-                bibl.set('source', idref)
-
-            # <profileDesc> : contient, dans un <particDesc>, puis <listPerson>,
-            # puis <person>, les diverses informations sur la vie de l'imprimeur
-            profiledesc = ET.SubElement(teiheader, 'profileDesc')
-            particdesc = ET.SubElement(profiledesc, 'particDesc')
-            listperson = ET.SubElement(particdesc, 'listPerson')
-            person = ET.SubElement(listperson, 'person')
-            # persName @type="standard" : contient forme normale du nom
-            persname1 = ET.SubElement(person, 'persName')
-            fullname = row[0] + ', ' + row[1]
-            if fullname:
-                persname1.set('type', 'standard')
-                persname1.text = fullname
-
-            # persName @type="alternative" : s'il y en a, contient les autres
-            # formes du nom
-            autres_noms = row[2]
-            list_noms = list(autres_noms.split("',"))
-            if list_noms:
-                for nom in range(len(list_noms)):
-                    persname2 = ET.SubElement(person, 'persName')
-                    persname2.set('type', 'alternative')
-                    list_nom = re.sub("^'", "", str(list_noms[nom]))
-                    list_nom = re.sub("'$", "", str(list_nom))
-                    persname2.text = str(list_nom)
-
-            # récupération du genre de l'imprimeur dans un élément <sex>
-            sex = ET.SubElement(person, 'sex')
-            gender = row[5]
-            sex.text = gender
-
-            # récupération de la date de naissance s'il y en a une dans un élément
-            # <birth>. Si la date est connue, elle est renseignée dans un @when avec
-            # un @cert qui a pour valeur "high". Si elle est inconnue, le @when a pour
-            # valeur par défaut 1600 et le @cert la valeur "low".
-            birth = ET.SubElement(person, 'birth')
-            birth_date = row[3]
-            if birth_date:
-                birth.set('when', birth_date)
-                birth.set('cert', 'high')
-            else:
-                birth.set('when', '1600')
-                birth.set('cert', 'low')
-
-            # récupération de la date de mort s'il y en a une dans un élément
-            # <death>. Si la date est connue, elle est renseignée dans un @when avec
-            # un @cert qui a pour valeur "high". Si elle est inconnue, le @when a pour
-            # valeur par défaut 1700 et le @cert la valeur "low".
-            death = ET.SubElement(person, 'death')
-            death_date = row[4]
-            if death_date:
-                death.set('when', death_date)
-                death.set('cert', 'high')
-            else:
-                death.set('when', '1700')
-                death.set('cert', 'low')
-
-            # les fiches ne concernant que des imprimeurs-libraires, l'élément
-            # <occupation> prend "Imprimeur-libraire" comme valeur par défaut.
-            occupation = ET.SubElement(person, 'occupation')
-            occupation.text = "Imprimeur-libraire"
-
-            # les éléments d'adresse (enseigne, rue, ville, indication) sont renseignés dans
-            # les éléments <objectName>, <street>, <settlement> et <country> (France par défaut)
-            residence = ET.SubElement(person, 'residence')
-            enseigne = row[9]
-            get_address = row[7] + ' ; ' + row[8]
-            rue = row[7]
-            indication = row[8]
-            city = row[6]
-
-            if enseigne and city and get_address:
-                residence.set('cert', 'high')
-            elif get_address and city:
-                residence.set('cert', 'high')
-            else:
-                residence.set('cert', 'low')
-
-            address = ET.SubElement(residence, 'address')
-
-            # ajout de l'enseigne s'il y en a une
-            objectname = ET.SubElement(address, 'objectName')
-            if enseigne:
-                objectname.text = enseigne
-            # ajout de l'adresse s'il y en a une
-            street = ET.SubElement(address, 'street')
-            if rue and indication:
-                street.text = rue + "  ; " + indication
-            elif rue:
-                street.text = rue
-            elif indication:
-                street.text = indication
-            # récupération du nom de la ville et son geonames
-            settlement = ET.SubElement(address, 'settlement')
-            if city:
-                settlement.text = city
-                cities = {
-                    "Anvers": "geonames:2803138",
-                    "Bordeaux": "geonames:3031582",
-                    "Chalon-sur-Saône": "geonames:3027484",
-                    "Dijon": "geonames:3021372",
-                    "Lyon": "geonames:2996944",
-                    "Marseille": "geonames:2995469",
-                    "Orléans": "geonames:2989317",
-                    "Paris": "geonames:2988507",
-                    "Poitiers": "geonames:2986495",
-                    "Pontoise": "geonames:2986140",
-                    "Rennes": "geonames:2983990",
-                    "Rouen": "geonames:2982652",
-                    "Saumur": "geonames:2975758",
-                    "Sens": "geonames:2975050",
-                    "Toul": "geonames:2972350",
-                    "Toulouse": "geonames:2972315",
-                    "Tours": "geonames:2972191",
-                    "Den Haag": "geonames:2747373"
-                }
-                for key, value in cities.items():
-                    if city == key:
-                        settlement.set('ref', value)
-            else:
-                settlement.set('ref', 'geonames:0000')
-
-            country = ET.SubElement(address, 'country')
-            country.text = "France"
-
-            # ajout des éléments biographiques provenant d'Idref
-            bio = row[11]
-
-            listevent = ET.SubElement(person, 'listEvent')
-            if bio:
-                event = ET.SubElement(listevent, 'event')
-                label = ET.SubElement(event, 'label')
-                label.set('type', 'bio')
-                label.set('source', 'IdRef')
-                bio = re.sub("^'", "", str(bio))
-                bio= re.sub("'$", "", str(bio))
-                label.text = str(bio)
-            else:
-                event = ET.SubElement(listevent, 'event')
-                label = ET.SubElement(event, 'label')
-                label.set('type', 'bio')
-
-            # ajout des éléments biographiques provenant d'Antonomaz (notes)
-            note = row[10]
-
-            if note:
-                event = ET.SubElement(listevent, 'event')
-                label = ET.SubElement(event, 'label')
-                label.set('type', 'bio')
-                label.set('source', 'Antonomaz')
-                label.text = note
-
-            # <revisionDesc> : permet d'indiquer la date la responsabilité de la création de
-            # la fiche et des éventuels changements effectués ensuite
-            revisiondesc = ET.SubElement(teiheader, 'revisionDesc')
-            listchange = ET.SubElement(revisiondesc, 'listChange')
-            change = ET.SubElement(listchange, 'change')
-            change.set('when', '2022-07-10')
-            change.set('who', '#ZC')
-            change.text = "Création de la fiche"
-
-            # TEI : pour chaque imprimeur, on récupère toutes les mazarinades qui contiennent un <publisher> avec son
-            # identifiant en parsant les fichiers tei des mazarinades
-
-            files = glob.glob("./Mazarinades/**/*.xml", recursive=True)
-            # on limite aux imprimeurs ayant un indentifiant
-            if isni:
-                for file in files:
-                    parser = etree.XMLParser(remove_blank_text=True)
-                    doc = etree.parse(file, parser)
-                    for key, value in get_maz_corresp(doc).items():
-                        # pour chaque imprimeur, si on lui trouve un identifiant identique dans les mazarinades,
-                        # on ajoute les mazarinades dans sa fiche au sein d'un élément <TEI>
-                        if key == isni:
-                            # dans le dictionnaire {Clé(identifiant) : Valeur(xml:id de ses mazarinades)}, on vérifie
-                            # que la clé est égale à l'identifiant de l'imprimeur, et on ajoute la valeur du xml:id à
-                            # l'attribut @corresp d'un élément TEI par mazarinade. Les valeurs sont récupérées sous
-                            # forme de liste.
-                            value = re.sub("^[^A-Z]", "", str(value))
-                            value = re.sub("'", "", str(value))
-                            value = re.sub("[^A-Z]$", ".xml", str(value))
-                            tei = ET.SubElement(root, 'TEI')
-                            tei.set('corresp', str(value))
-
-                            # <teiHeader> : métadonnées des mazarinades
-                            teiheader2 = ET.SubElement(tei, 'teiHeader')
-                            filedesc2 = ET.SubElement(teiheader2, 'fileDesc')
-                            # <titleStmt>
-                            titlestmt2 = ET.SubElement(filedesc2, 'titleStmt')
-                            title2 = ET.SubElement(titlestmt2, 'title')
-                            # récupération du titre des mazarinades
-                            for title_key, title_value in get_maz_title(doc).items():
-                                title_value = re.sub("\['", "", str(title_value))
-                                title_value = re.sub("'\]", "", str(title_value))
-                                title_value = re.sub("\[\"", "", str(title_value))
-                                title_value = re.sub("\"\]", "", str(title_value))
-                                title2.text = str(title_value)
-
-                            # récupération de l'auteur/des auteurs des mazarinades
-                            for authors_dict_key, authors_dict_value in get_maz_author(doc).items():
-                                authors_dict = authors_dict_value
-                            for author_id, author_name in authors_dict.items():
-                                author = ET.SubElement(titlestmt2, 'author')
-                                if author_id == "id":
-                                    author.set('ref', 'isni:0000')
-                                    author.text = ' '.join(author_name)
-                                else:
-                                    author.set('ref', str(author_id))
-                                    author.text = ' '.join(author_name)
-
-                            # <extent> : informations matérielles des mazarinades
-                            extent = ET.SubElement(filedesc2, 'extent')
-                            # récupération du nombre de pages
-                            measure1 = ET.SubElement(extent, 'measure')
-                            measure1.set('unit', 'pages')
-                            for pages_key, pages_value in get_maz_pages(doc).items():
-                                pages_value = re.sub("\['", "", str(pages_value))
-                                pages_value = re.sub("'\]", "", str(pages_value))
-                                measure1.set('quantity', str(pages_value))
-
-                            # présence ou absence d'une marque d'imprimeur
-                            measure2 = ET.SubElement(extent, 'measure')
-                            measure2.set('unit', 'decoration')
-                            for deco_key, deco_value in get_maz_deco(doc).items():
-                                if deco_value:
-                                    deco_value = re.sub("\[", "", str(deco_value))
-                                    deco_value = re.sub("\]", "", str(deco_value))
-                                    measure2.set('quantity', str(deco_value))
-                                else:
-                                    measure2.set('quantity', '0')
-
-                            # <publicationStmt> : informations sur le contexte de diffusion des
-                            # mazarinades dans leur encodage (projet Antonomaz)
-                            publicationstmt = ET.SubElement(filedesc2, 'publicationStmt')
-                            publisher = ET.SubElement(publicationstmt, 'publisher')
-                            publisher.set('ref', 'https://github.com/Antonomaz')
-                            publisher.text = 'Antonomaz'
-                            availability = ET.SubElement(publicationstmt, 'availability')
-                            availability.set('status', 'restricted')
-                            availability.set('n', 'cc-by')
-                            licence = ET.SubElement(availability, 'licence')
-                            licence.set('target', 'https://creativecommons.org/licenses/by/4.0')
-
-                            # <sourceDesc>
-                            sourcedesc2 = ET.SubElement(filedesc2, 'sourceDesc')
-                            msdesc = ET.SubElement(sourcedesc2, 'msDesc')
-                            msidentifier = ET.SubElement(msdesc, 'msIdentifier')
-
-                            # récupération de l'institution de conservation des mazarinades
-                            repository = ET.SubElement(msidentifier, 'repository')
-                            for repo_key, repo_value in get_maz_repo(doc).items():
-                                repo_value = ' '.join(repo_value)
-                                repo_value = re.sub(" ,", ",", repo_value)
-                                repository.text = repo_value
-
-                            # récupération du lien vers la numérisation des mazarinades
-                            idno = ET.SubElement(msidentifier, 'idno')
-                            for idno_key, idno_value in get_maz_idno(doc).items():
-                                idno_value = re.sub("\['", "", str(idno_value))
-                                idno_value = re.sub("'\]", "", str(idno_value))
-                                idno.set('source', str(idno_value))
-
-                            physdesc = ET.SubElement(msdesc, 'physDesc')
-                            decodesc = ET.SubElement(physdesc, 'decoDesc')
-                            deconote = ET.SubElement(decodesc, 'decoNote')
-                            text = ET.SubElement(tei, 'text')
-                            body = ET.SubElement(text, 'body')
-                            div = ET.SubElement(body, 'div')
-
-            # Ajout des @xml:id des imprimeurs, qui correspondent aussi aux noms des fichiers ajoutés
-            # ensuite automatiquement
-            if fullname:
-                fullname2 = row[0] + row[1]
-                fullname2 = re.sub(" |\(|\)|'|’|-|,|\.", "", fullname2)
-                fullname2 = re.sub("é|è|ë|ê", "e", fullname2)
-                fullname2 = re.sub("É|È|Ë|Ê", "E", fullname2)
-                fullname2 = re.sub("ç|Ç", "c", fullname2)
-                fullname2 = re.sub("ô|Ô", "o", fullname2)
-                xmlids = "IL_" + fullname2
-                root.set('xml:id', xmlids)
-                # nommage des fichiers
-                name_file = 'IL_' + fullname2
-
-            # Écriture des fichiers xml
-            tree = ET.ElementTree(root)
-
-            tree.write("printers_Antonomaz/%s.xml" % name_file, xml_declaration=True, encoding="utf-8")
-
-
-def add_empty_maz():
+            # en mode incrémental, on passe les imprimeurs dont ni la ligne du TSV ni les mazarinades n'ont changé
+            name_file = get_xmlid(row)
+            path = "printers_Antonomaz/%s.xml" % name_file
+            # on récupère dans l'index toutes les mazarinades qui contiennent un <publisher> avec l'identifiant de
+            # l'imprimeur (ou, avec link_names, avec l'une des formes de son nom)
+            printed = mazarinades.get(row[14] or name_file, [])
+            if incremental:
+                fingerprint = hashlib.sha1(json.dumps([row, printed]).encode("utf-8")).hexdigest()
+                new_fingerprints[name_file] = fingerprint
+                if fingerprints.get(name_file) == fingerprint and os.path.exists(path):
+                    continue
+
+            # <teiHeader> : contient les informations sur l'imprimeur ; il est écrit dans l'élément racine
+            # <teiCorpus> par write_printer
+            with profiler.stage("tree"):
+                teiheader = printer_header(row)
+
+            # TEI : les mazarinades de l'imprimeur sont écrites à la suite du <teiHeader> par write_printer, chacune
+            # dans un élément <TEI>, sans garder tout le <teiCorpus> en mémoire.
+            # Écriture des fichiers xml (seulement si leur contenu a changé)
+            write_printer(path, name_file, teiheader, printed)
+            generated.append(path)
+
+    if incremental:
+        with connection:
+            connection.execute("DELETE FROM printers")
+            connection.executemany("INSERT INTO printers VALUES (?, ?)", new_fingerprints.items())
+        connection.close()
+
+    return generated
+
+
+def add_empty_maz(files=None):
     """Cette fonction sert à ajouter un élément <TEI> sans information dans les <teiCorpus> des imprimeurs pour lesquels
-    on n'a pas de mazarinade"""
-
-    files = glob.glob("printers_Antonomaz/*.xml", recursive=True)
-    output = []
+    on n'a pas de mazarinade. Les fiches générées par to_tei le contiennent déjà : elle ne sert plus qu'à corriger des
+    fiches existantes. Chaque fiche est lue en flux jusqu'à son premier <TEI>, et seules les fiches qui n'en ont pas
+    sont relues entièrement et réécrites. Par défaut, toutes les fiches sont traitées.
+    Retourne la liste des fiches corrigées."""
+
+    if files is None:
+        with profiler.stage("glob"):
+            files = glob.glob("printers_Antonomaz/*.xml", recursive=True)
+    fixed = []
     for file in files:
+        # on vérifie la présence ou l'absence d'un élément <TEI>, sans lire la suite du fichier
+        with profiler.stage("parse"):
+            context = etree.iterparse(file, events=("start",), tag=tei_tei)
+            has_tei = next(iter(context), None) is not None
+            del context
+        profiler.count("files_parsed")
+        if has_tei:
+            continue
+
+        # s'il est absent, on ajoute le <TEI> neutre
         parser = etree.XMLParser(remove_blank_text=True)
-        doc = etree.parse(file, parser)
+        with profiler.stage("parse"):
+            doc = etree.parse(file, parser)
+        profiler.count("files_parsed")
+        with profiler.stage("tree"):
+            doc.getroot().append(clone_template(empty_maz_template)[0])
 
-        # on crée les éléments à ajouter dans le cas où il n'y a pas d'élément <TEI> dans les fichiers. Tous les
-        # attributs et les éléments ont des valeurs neutres quand des valeurs doivent être renseignées.
-        tei = etree.Element('TEI', attrib={'corresp': 'none'})
-        teiheader = etree.SubElement(tei, 'teiHeader')
-        filedesc = etree.SubElement(teiheader, 'fileDesc')
-        titleStmt = etree.SubElement(filedesc, 'titleStmt')
-        title = etree.SubElement(titleStmt, 'title')
-        author = etree.SubElement(titleStmt, 'author', attrib={'ref': 'isni:0000'})
-        extent = etree.SubElement(filedesc, 'extent')
-        measure = etree.SubElement(extent, 'measure', attrib={'unit': 'pages', 'quantity': '0'})
-        publicationstmt = etree.SubElement(filedesc, 'publicationStmt')
-        publisher = etree.SubElement(publicationstmt, 'publisher', attrib={'ref': 'https://github.com/Antonomaz',
-                                                                           # 'xml:id': 'Antonomaz'
-                                                                           })
-
-        publisher.text = 'Antonomaz'
-        availability = etree.SubElement(publicationstmt, 'availability', attrib={'status': 'restricted',
-                                                                                 'n': 'cc-by'})
-        licence = etree.SubElement(availability, 'licence', attrib={
-            'target': 'https://creativecommons.org/licenses/by/4.0'})
-        sourcedesc = etree.SubElement(filedesc, 'sourceDesc')
-        msdesc = etree.SubElement(sourcedesc, 'msDesc')
-        msidentifier = etree.SubElement(msdesc, 'msIdentifier')
-        repository = etree.SubElement(msidentifier, 'repository')
-        repository.text = 'Sans lieu'
-        idno = etree.SubElement(msidentifier, 'idno', attrib={'source': 'None'})
-        physdesc = etree.SubElement(msdesc, 'physDesc')
-        decodesc = etree.SubElement(physdesc, 'decoDesc')
-        deconote = etree.SubElement(decodesc, 'decoNote')
-        text = etree.SubElement(tei, 'text')
-        body = etree.SubElement(text, 'body')
-        div = etree.SubElement(body, 'div')
-
-        # on vérifie la présence ou l'absence d'un élément <TEI>. S'il est absent, on ajoute le <TEI> neutre.
-        if doc.xpath(".//tei:TEI", namespaces=ns):
-            ''
-        else:
-            teicorpus = doc.xpath("/tei:teiCorpus", namespaces=ns)[0]
-            teicorpus.append(tei)
-            tei.append(teiheader)
-            teiheader.append(filedesc)
-            filedesc.append(titleStmt)
-            titleStmt.append(title)
-            titleStmt.append(author)
-            filedesc.append(extent)
-            extent.append(measure)
-            filedesc.append(publicationstmt)
-            publicationstmt.append(publisher)
-            publicationstmt.append(availability)
-            availability.append(licence)
-            filedesc.append(sourcedesc)
-            sourcedesc.append(msdesc)
-            msdesc.append(msidentifier)
-            msidentifier.append(repository)
-            msidentifier.append(idno)
-            msdesc.append(physdesc)
-            physdesc.append(decodesc)
-            decodesc.append(deconote)
-            tei.append(text)
-            text.append(body)
-            body.append(div)
-
-            # on écrit dans les fichiers
-            with open(file, "w+") as sortie_xml:
-                output = etree.tostring(doc, pretty_print=True, encoding='utf-8', xml_declaration=True).decode(
-                    'utf8')
-                sortie_xml.write(str(output))
+        # on écrit dans les fichiers
+        with profiler.stage("serialization"):
+            output = etree.tostring(doc, pretty_print=True, encoding='utf-8', xml_declaration=True)
+        write_if_changed(file, output)
+        fixed.append(file)
+
+    return fixed
 
 
 if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Création des fiches TEI des imprimeurs")
+    argparser.add_argument("-w", "--workers", type=int, default=1,
+                           help="nombre de processus utilisés pour parser les mazarinades (1 par défaut)")
+    argparser.add_argument("--stream", action="store_true",
+                           help="lit les mazarinades de plus de 1 Mo en flux, en ne gardant que le <teiHeader> en mémoire")
+    argparser.add_argument("--cache", default=".mazarinades_cache.sqlite",
+                           help="cache des métadonnées des mazarinades (.mazarinades_cache.sqlite par défaut)")
+    argparser.add_argument("--no-cache", dest="cache", action="store_const", const=None,
+                           help="relit toutes les mazarinades sans utiliser de cache")
+    argparser.add_argument("-i", "--incremental", action="store_true",
+                           help="ne régénère que les fiches dont la ligne du TSV ou les mazarinades ont changé")
+    argparser.add_argument("--link-names", action="store_true",
+                           help="relie aussi les <publisher> sans @ref aux imprimeurs d'après leur nom")
+    argparser.add_argument("--fix-empty", action="store_true",
+                           help="ajoute seulement les <TEI> neutres manquants dans les fiches existantes")
+    argparser.add_argument("--profile", nargs="?", const="printers_to_tei.profile.json", metavar="FICHIER",
+                           help="mesure la durée, les compteurs et le pic de mémoire de chaque étape et écrit le "
+                                "rapport en JSON (printers_to_tei.profile.json par défaut)")
+    argparser.add_argument("--snapshot", metavar="FICHIER",
+                           help="écrit aussi l'instantané binaire des fiches générées (voir printers_snapshot.py)")
+    args = argparser.parse_args()
+    if args.incremental and not args.cache:
+        argparser.error("--incremental nécessite le cache (incompatible avec --no-cache)")
+
+    if args.profile:
+        profiler.start()
+
     try:
         os.mkdir('printers_Antonomaz')
     except:
         pass
-    # On procède d'abord à l'encodage automatique des fiches d'imprimeurs
-    to_tei()
-    # Puis on ajoute les <TEI> neutres
-    add_empty_maz()
\ No newline at end of file
+    if args.fix_empty:
+        # correction des fiches existantes : ajout des <TEI> neutres manquants, sans régénérer les fiches
+        add_empty_maz()
+    else:
+        # encodage automatique des fiches d'imprimeurs (les <TEI> neutres sont ajoutés lors de la génération)
+        to_tei(workers=args.workers, stream=args.stream, cache=args.cache, incremental=args.incremental,
+               link_names=args.link_names)
+    if args.snapshot:
+        # import ici : printers_database importe ce module
+        from printers_database import PrinterDatabase
+        from printers_snapshot import write_snapshot
+        with profiler.stage("snapshot"):
+            write_snapshot(PrinterDatabase.from_tei('printers_Antonomaz'), args.snapshot)
+    if args.profile:
+        profiler.write(args.profile)
\ No newline at end of file
@@ -0,0 +1,196 @@
+import json
+import resource
+import threading
+import time
+from contextlib import nullcontext
+
+
+# Instrumentation des scripts (option --profile) : les étapes (lecture des fichiers, parsing, XPath, construction
+# des arbres, sérialisation, requêtes SPARQL...) sont chronométrées avec profiler.stage(), et les compteurs (fichiers
+# parsés, octets écrits, requêtes HTTP...) incrémentés avec profiler.count(). Tant que le profileur n'est pas
+# démarré, ces appels ne font rien.
+#
+# Pour chaque étape, le rapport donne le nombre d'appels, la durée totale (time), la durée hors des étapes imbriquées
+# (self_time) et le pic de mémoire résidente du processus pendant l'étape (VmHWM de /proc/self/status, remis à zéro
+# à chaque mesure), qui compte aussi la mémoire allouée par libxml2 pour les arbres lxml. Le pic est celui de tout
+# le processus : les étapes exécutées en même temps dans d'autres threads y contribuent. Les durées des étapes
+# exécutées dans plusieurs threads sont additionnées ; les étapes exécutées dans d'autres processus ne sont pas
+# mesurées.
+
+
+def peak_rss():
+    """
+    Retourne le pic de mémoire résidente du processus, en octets : VmHWM de /proc/self/status, ou à défaut (hors de
+    Linux) ru_maxrss, qui ne peut pas être remis à zéro.
+    """
+
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def reset_peak_rss():
+    """
+    Remet le pic de mémoire résidente du processus à la mémoire résidente actuelle (Linux), s'il est possible
+    d'écrire dans /proc/self/clear_refs.
+    """
+
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+class Profiler:
+    """
+    Durées, compteurs et pics de mémoire des étapes d'un script.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started = None
+        self.null = nullcontext()
+
+    def start(self):
+        """
+        Démarre le profileur ; les mesures précédentes sont effacées.
+        """
+
+        self.stages = {}
+        self.counters = {}
+        self.enabled = True
+        self.started = time.perf_counter()
+
+    def stage(self, name):
+        """
+        Retourne un gestionnaire de contexte qui mesure une étape : with profiler.stage("parse"): ...
+        """
+
+        if not self.enabled:
+            return self.null
+        return Stage(self, name)
+
+    def count(self, name, value=1):
+        """
+        Ajoute value au compteur name.
+        """
+
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def active(self):
+        """
+        Retourne la pile des étapes en cours dans le thread courant.
+        """
+
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def record_peak(self):
+        """
+        Reporte le pic de mémoire atteint depuis la dernière mesure sur les étapes en cours du thread courant, puis
+        remet le pic à zéro.
+        """
+
+        peak = peak_rss()
+        for stage in self.active():
+            stage.peak = max(stage.peak, peak)
+        reset_peak_rss()
+
+    def report(self):
+        """
+        Retourne le rapport (dictionnaire) : durée totale, pic de mémoire, étapes (dans l'ordre de leur premier
+        appel) et compteurs.
+        """
+
+        peak = peak_rss()
+        with self.lock:
+            stages = {name: dict(values, time=round(values["time"], 6), self_time=round(values["self_time"], 6))
+                      for name, values in self.stages.items()}
+            return {
+                "wall_time": round(time.perf_counter() - self.started, 6) if self.started else 0,
+                "peak_memory": max([peak] + [values["peak_memory"] for values in stages.values()]),
+                "stages": stages,
+                "counters": dict(self.counters),
+            }
+
+    def stop(self):
+        """
+        Arrête le profileur.
+        """
+
+        self.enabled = False
+
+    def write(self, path):
+        """
+        Arrête le profileur et écrit le rapport dans un fichier JSON.
+        Retourne le rapport.
+        """
+
+        report = self.report()
+        self.stop()
+        with open(path, "w") as output:
+            json.dump(report, output, indent=2)
+        return report
+
+
+class Stage:
+    """
+    Mesure d'un appel d'une étape (voir Profiler.stage).
+    """
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.peak = 0
+        self.children = 0.0
+
+    def __enter__(self):
+        # le pic atteint jusqu'ici appartient aux étapes englobantes
+        self.profiler.record_peak()
+        self.profiler.active().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.profiler.record_peak()
+        stack = self.profiler.active()
+        stack.pop()
+        if stack:
+            stack[-1].children += elapsed
+        with self.profiler.lock:
+            values = self.profiler.stages.setdefault(self.name, {"calls": 0, "time": 0.0, "self_time": 0.0,
+                                                                 "peak_memory": 0})
+            values["calls"] += 1
+            values["time"] += elapsed
+            values["self_time"] += elapsed - self.children
+            values["peak_memory"] = max(values["peak_memory"], self.peak)
+        return False
+
+
+# profileur partagé par les scripts
+profiler = Profiler()
+
+
+def disable_profiler():
+    """
+    Arrête le profileur dans un processus de travail (initializer de ProcessPoolExecutor) : un processus créé par
+    fork hérite du profileur démarré, dont les mesures seraient perdues.
+    """
+
+    profiler.stop()
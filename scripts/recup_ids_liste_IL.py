@@ -1,6 +1,7 @@
-import re
 import csv
 
+from identifiers import expand
+
 
 base = 'Liste_IL_MAZ.tsv'
 
@@ -18,10 +19,7 @@ with open(base) as tsvfile:
     next(tsvreader, None)  # cette ligne sert à ne pas lire les headers du fichier
     for row in tsvreader:
         old_id = row[2]
-        new_ident = row[2]
-        new_ident = re.sub(" ", "", new_ident)
-        new_ident = re.sub("^(isni:)", "http://isni.org/isni/", new_ident)
-        new_ident = re.sub("^(viaf:)", "http://viaf.org/viaf/", new_ident)
+        new_ident = expand(row[2])
         if old_id:
             identifiants[old_id] = new_ident
 
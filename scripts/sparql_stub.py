@@ -0,0 +1,187 @@
+import argparse
+import ast
+import csv
+import glob
+import json
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+from base_imprimeurs_sparql import columns, separator
+
+
+# Endpoint SPARQL local qui remplace data.idref.fr pour les tests et les mesures de performance de la récolte :
+# il répond aux requêtes de base_imprimeurs_sparql.py à partir de réponses enregistrées (fixtures), avec une
+# latence, une variation de latence (jitter) et un taux d'erreurs configurables.
+
+values_block = re.compile(r"VALUES\s+\?id\s*\{([^}]*)\}")
+
+
+def fixtures_from_cache(directory=".sparql_cache"):
+    """
+    Construit les fixtures à partir des réponses enregistrées dans le cache de base_imprimeurs_sparql.py
+    (SparqlCache) : les résultats de chaque réponse sont répartis selon leur variable ?id.
+    Retourne un dictionnaire :
+    - en clé = l'identifiant (isni, viaf...)
+    - en valeur = la liste des résultats (bindings) de cet identifiant, sans la variable ?id
+    """
+
+    fixtures = {}
+    for path in glob.glob(directory + "/*.json"):
+        with open(path, encoding="utf-8") as cached:
+            results = json.load(cached)
+        for binding in results["results"]["bindings"]:
+            binding = dict(binding)
+            identifier = binding.pop("id")["value"]
+            fixtures.setdefault(identifier, []).append(binding)
+    return fixtures
+
+
+def parse_list(value):
+    """
+    Relit une colonne du TSV écrite sous forme de liste Python ("['a', 'b']"). Certaines cellules ont été
+    retouchées à la main et ne sont plus des listes valides : elles sont alors gardées comme une seule valeur.
+    Retourne une liste.
+    """
+
+    try:
+        values = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return [value.strip("[]'\"")]
+    return values if isinstance(values, list) else [str(values)]
+
+
+def fixtures_from_tsv(path="../CSV/Antonomaz/base_imprimeurs_sparql.tsv"):
+    """
+    Construit les fixtures à partir du TSV produit par base_imprimeurs_sparql.py : chaque ligne redevient le
+    résultat SPARQL de l'imprimeur, associé à chacun de ses identifiants (colonne Identifiants).
+    Retourne un dictionnaire au même format que fixtures_from_cache.
+    """
+
+    fixtures = {}
+    with open(path) as tsvfile:
+        tsvreader = csv.reader(tsvfile, delimiter="\t")
+        next(tsvreader, None)  # cette ligne sert à ne pas lire les headers du fichier
+        for row in tsvreader:
+            binding = {}
+            for (fieldname, variable, multiple), value in zip(columns, row):
+                if not value:
+                    continue
+                if multiple:
+                    value = separator.join(parse_list(value))
+                kind = "uri" if variable == "person" else "literal"
+                binding[variable] = {"type": kind, "value": value}
+            identifiers = binding.get("ident", {}).get("value", "").split(separator)
+            for identifier in filter(None, identifiers):
+                fixtures.setdefault(identifier, []).append(binding)
+    return fixtures
+
+
+class SparqlStubHandler(BaseHTTPRequestHandler):
+    """
+    Répond aux requêtes SPARQL (GET ou POST, paramètre query) : les identifiants du bloc VALUES ?id sont cherchés
+    dans les fixtures du serveur, après une latence simulée ; une partie des requêtes reçoit une erreur 503.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.answer(parse_qs(urlparse(self.path).query).get("query", [""])[0])
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.answer(parse_qs(self.rfile.read(length).decode("utf-8")).get("query", [""])[0])
+
+    def answer(self, query):
+        server = self.server
+        with server.lock:
+            server.stats["requests"] += 1
+            server.stats["in_flight"] += 1
+            server.stats["max_in_flight"] = max(server.stats["max_in_flight"], server.stats["in_flight"])
+            delay = max(0.0, server.latency + server.random.uniform(-server.jitter, server.jitter))
+            error = server.random.random() < server.error_rate
+        try:
+            time.sleep(delay)
+            if error:
+                with server.lock:
+                    server.stats["errors"] += 1
+                self.send("503 Service Unavailable".encode("utf-8"), status=503, content_type="text/plain")
+                return
+
+            match = values_block.search(query)
+            identifiers = [item.strip("<>") for item in match.group(1).split()] if match else []
+            bindings = []
+            for identifier in identifiers:
+                for binding in server.fixtures.get(identifier, []):
+                    bindings.append(dict(binding, id={"type": "uri", "value": identifier}))
+            variables = ["id"] + [variable for fieldname, variable, multiple in columns]
+            results = {"head": {"vars": variables}, "results": {"bindings": bindings}}
+            self.send(json.dumps(results, ensure_ascii=False).encode("utf-8"))
+        finally:
+            with server.lock:
+                server.stats["in_flight"] -= 1
+
+    def send(self, body, status=200, content_type="application/sparql-results+json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(fixtures, latency=0.0, jitter=0.0, error_rate=0.0, seed=None, host="127.0.0.1", port=0):
+    """
+    Démarre l'endpoint local dans un thread, sur le port donné (0 : port libre choisi par le système).
+    latency et jitter sont en secondes : chaque réponse est retardée de latency ± jitter. error_rate est la
+    proportion de requêtes qui reçoivent une erreur 503 ; seed rend la latence et les erreurs reproductibles.
+    Retourne le serveur : server.url est l'adresse de l'endpoint, server.stats compte les requêtes, les erreurs et
+    le nombre maximal de requêtes traitées simultanément ; server.shutdown() l'arrête.
+    """
+
+    server = ThreadingHTTPServer((host, port), SparqlStubHandler)
+    server.daemon_threads = True
+    server.fixtures = fixtures
+    server.latency = latency
+    server.jitter = jitter
+    server.error_rate = error_rate
+    server.random = random.Random(seed)
+    server.lock = threading.Lock()
+    server.stats = {"requests": 0, "errors": 0, "in_flight": 0, "max_in_flight": 0}
+    server.url = "http://%s:%d/sparql" % server.server_address[:2]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Endpoint SPARQL local rejouant des réponses IdRef enregistrées")
+    argparser.add_argument("--from-cache", metavar="DOSSIER",
+                           help="construit les fixtures à partir du cache des réponses SPARQL")
+    argparser.add_argument("--from-tsv", metavar="FICHIER", default="../CSV/Antonomaz/base_imprimeurs_sparql.tsv",
+                           help="construit les fixtures à partir du TSV de la récolte (par défaut)")
+    argparser.add_argument("--port", type=int, default=8890, help="port d'écoute (8890 par défaut)")
+    argparser.add_argument("--latency", type=float, default=0.0, help="latence de chaque réponse, en secondes")
+    argparser.add_argument("--jitter", type=float, default=0.0, help="variation de la latence, en secondes")
+    argparser.add_argument("--error-rate", type=float, default=0.0, help="proportion de réponses en erreur 503")
+    argparser.add_argument("--seed", type=int, help="graine du générateur aléatoire")
+    args = argparser.parse_args()
+
+    if args.from_cache:
+        fixtures = fixtures_from_cache(args.from_cache)
+    else:
+        fixtures = fixtures_from_tsv(args.from_tsv)
+
+    stub = start_stub(fixtures, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                      seed=args.seed, port=args.port)
+    print("%d identifiants disponibles sur %s" % (len(fixtures), stub.url))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.shutdown()
+        print(stub.stats)